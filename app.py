@@ -3,7 +3,9 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
-from utils.patient_data import PatientDataManager
+from utils.patient_data import PatientDataManager, HEALTH_METRICS
+from utils.patient_store import open_store
+from utils.patient_index import age_band
 from utils.ai_integration import AIIntegration
 from utils.health_analytics import HealthAnalytics
 import os
@@ -16,13 +18,25 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Initialize session state
-if 'patient_data_manager' not in st.session_state:
-    st.session_state.patient_data_manager = PatientDataManager()
-if 'ai_integration' not in st.session_state:
-    st.session_state.ai_integration = AIIntegration()
-if 'health_analytics' not in st.session_state:
-    st.session_state.health_analytics = HealthAnalytics()
+# Shared, process-wide services: every browser session sees the same patients
+@st.cache_resource
+def get_patient_data_manager():
+    # Persist patients across restarts when a storage location is configured
+    return PatientDataManager(store=open_store())
+
+@st.cache_resource
+def get_ai_integration():
+    return AIIntegration()
+
+@st.cache_resource
+def get_health_analytics():
+    return HealthAnalytics(get_patient_data_manager())
+
+patient_data_manager = get_patient_data_manager()
+ai_integration = get_ai_integration()
+health_analytics = get_health_analytics()
+
+# Initialize per-user session state
 if 'chat_history' not in st.session_state:
     st.session_state.chat_history = []
 if 'current_patient' not in st.session_state:
@@ -38,12 +52,25 @@ def main():
         st.header("Patient Profile")
         
         # Patient selection/creation
-        patient_names = st.session_state.patient_data_manager.get_patient_names()
+        with st.expander("Filter Patients"):
+            gender_filter = st.selectbox("Gender", ["Any", "Male", "Female", "Other"], key="gender_filter")
+            age_band_filter = st.selectbox("Age Band", ["Any"] + [age_band(age) for age in range(0, 120, 10)], key="age_band_filter")
+            history_filter = st.text_input("Medical History Contains", key="history_filter")
+        
+        if gender_filter != "Any" or age_band_filter != "Any" or history_filter:
+            patient_ids = patient_data_manager.find_patients(
+                age_band=None if age_band_filter == "Any" else age_band_filter,
+                gender=None if gender_filter == "Any" else gender_filter,
+                history_terms=history_filter or None
+            )
+            patient_names = sorted(patient_data_manager.get_patient_name(patient_id) for patient_id in patient_ids)
+        else:
+            patient_names = patient_data_manager.get_patient_names()
         
         if patient_names:
             selected_patient = st.selectbox("Select Patient", patient_names)
             if st.button("Load Patient"):
-                st.session_state.current_patient = st.session_state.patient_data_manager.get_patient(selected_patient)
+                st.session_state.current_patient = patient_data_manager.get_patient(selected_patient)
                 st.success(f"Loaded profile for {selected_patient}")
         
         # Create new patient
@@ -62,7 +89,7 @@ def main():
                             'gender': gender,
                             'medical_history': medical_history
                         }
-                        st.session_state.patient_data_manager.create_patient(patient_data)
+                        patient_data_manager.create_patient(patient_data)
                         st.session_state.current_patient = patient_data
                         st.success(f"Created profile for {name}")
                         st.rerun()
@@ -115,18 +142,16 @@ def display_patient_chat():
         # Display user message
         st.chat_message("user").write(prompt)
         
-        # Get AI response
+        # Stream the AI response as it is generated
         with st.chat_message("assistant"):
-            with st.spinner("Getting AI response..."):
-                patient_context = ""
-                if st.session_state.current_patient:
-                    patient_context = f"Patient: {st.session_state.current_patient['name']}, Age: {st.session_state.current_patient['age']}, Gender: {st.session_state.current_patient['gender']}, Medical History: {st.session_state.current_patient.get('medical_history', 'None')}"
-                
-                response = st.session_state.ai_integration.answer_patient_query(prompt, patient_context)
-                st.write(response)
-                
-                # Add AI response to chat history
-                st.session_state.chat_history.append({"role": "assistant", "content": response})
+            patient_context = ""
+            if st.session_state.current_patient:
+                patient_context = f"Patient: {st.session_state.current_patient['name']}, Age: {st.session_state.current_patient['age']}, Gender: {st.session_state.current_patient['gender']}, Medical History: {st.session_state.current_patient.get('medical_history', 'None')}"
+            
+            response = st.write_stream(ai_integration.stream_patient_query(prompt, patient_context))
+            
+            # Add the complete AI response to chat history
+            st.session_state.chat_history.append({"role": "assistant", "content": response})
     
     # Clear chat button
     if st.button("Clear Chat History"):
@@ -182,7 +207,7 @@ def display_disease_prediction():
                 'additional_symptoms': additional_symptoms
             }
             
-            prediction = st.session_state.ai_integration.predict_disease(symptom_data, patient_info)
+            prediction = ai_integration.predict_disease(symptom_data, patient_info)
             
             st.subheader("Analysis Results")
             st.write(prediction)
@@ -240,7 +265,7 @@ def display_treatment_plans():
                 'lifestyle_preferences': lifestyle_preferences
             }
             
-            treatment_plan = st.session_state.ai_integration.generate_treatment_plan(treatment_data, patient_info)
+            treatment_plan = ai_integration.generate_treatment_plan(treatment_data, patient_info)
             
             st.subheader("Personalized Treatment Plan")
             st.write(treatment_plan)
@@ -256,8 +281,11 @@ def display_health_analytics():
         st.warning("Please select or create a patient profile first.")
         return
     
-    # Generate sample health data for the current patient
-    health_data = st.session_state.patient_data_manager.generate_health_data(st.session_state.current_patient['name'])
+    # Only load the selected window of the patient's health data
+    time_range = st.selectbox("Time Range", ["Last 7 Days", "Last 30 Days", "Last 90 Days", "All Time"], index=1)
+    range_days = {"Last 7 Days": 7, "Last 30 Days": 30, "Last 90 Days": 90}.get(time_range)
+    start = datetime.now() - timedelta(days=range_days) if range_days else None
+    health_data = patient_data_manager.get_health_data(st.session_state.current_patient['name'], start=start)
     
     if health_data.empty:
         st.info("No health data available. Health metrics will be displayed here once data is recorded.")
@@ -299,30 +327,54 @@ def display_health_analytics():
     # Charts
     st.subheader("Health Trends")
     
+    # Long windows are charted from daily rollups instead of every raw reading
+    chart_data = health_data
+    if range_days is None or range_days > 30:
+        rollup = patient_data_manager.get_health_rollup(st.session_state.current_patient['name'], start=start, resolution=timedelta(days=1))
+        chart_data = rollup.rename(columns={f'{metric}_mean': metric for metric in HEALTH_METRICS})
+    
     # Heart rate chart
-    fig_hr = px.line(health_data, x='date', y='heart_rate', title='Heart Rate Over Time')
+    fig_hr = px.line(chart_data, x='date', y='heart_rate', title='Heart Rate Over Time')
     fig_hr.update_traces(line_color='red')
+    if chart_data is health_data:
+        # 7-day rolling mean +/- one std as a shaded band
+        rolling = health_analytics.calculate_rolling_windows(health_data)
+        fig_hr.add_trace(go.Scatter(x=rolling['date'], y=rolling['heart_rate_mean_7d'] + rolling['heart_rate_std_7d'],
+                                    mode='lines', line=dict(width=0), showlegend=False, hoverinfo='skip'))
+        fig_hr.add_trace(go.Scatter(x=rolling['date'], y=rolling['heart_rate_mean_7d'] - rolling['heart_rate_std_7d'],
+                                    mode='lines', line=dict(width=0), fill='tonexty', fillcolor='rgba(255, 0, 0, 0.1)',
+                                    name='7-day band'))
+        fig_hr.add_trace(go.Scatter(x=rolling['date'], y=rolling['heart_rate_mean_7d'],
+                                    mode='lines', name='7-day average', line=dict(color='darkred', dash='dot')))
     st.plotly_chart(fig_hr, use_container_width=True)
     
     # Blood pressure chart
     fig_bp = go.Figure()
-    fig_bp.add_trace(go.Scatter(x=health_data['date'], y=health_data['systolic'], 
+    fig_bp.add_trace(go.Scatter(x=chart_data['date'], y=chart_data['systolic'], 
                                mode='lines', name='Systolic', line=dict(color='blue')))
-    fig_bp.add_trace(go.Scatter(x=health_data['date'], y=health_data['diastolic'], 
+    fig_bp.add_trace(go.Scatter(x=chart_data['date'], y=chart_data['diastolic'], 
                                mode='lines', name='Diastolic', line=dict(color='orange')))
     fig_bp.update_layout(title='Blood Pressure Over Time', xaxis_title='Date', yaxis_title='mmHg')
     st.plotly_chart(fig_bp, use_container_width=True)
     
     # Blood glucose chart
-    fig_bg = px.line(health_data, x='date', y='blood_glucose', title='Blood Glucose Over Time')
+    fig_bg = px.line(chart_data, x='date', y='blood_glucose', title='Blood Glucose Over Time')
     fig_bg.add_hline(y=100, line_dash="dash", line_color="green", annotation_text="Normal Range")
     fig_bg.update_traces(line_color='purple')
     st.plotly_chart(fig_bg, use_container_width=True)
     
+    # Risk timeline over the selected window
+    episodes = health_analytics.calculate_risk_episodes(health_data)
+    with st.expander(f"Risk Episodes ({len(episodes)})"):
+        if episodes.empty:
+            st.write("No readings met a risk threshold in this period.")
+        else:
+            st.dataframe(episodes, use_container_width=True)
+    
     # AI-generated insights
     st.subheader("AI Health Insights")
     with st.spinner("Generating health insights..."):
-        insights = st.session_state.health_analytics.generate_insights(health_data, st.session_state.current_patient)
+        insights = health_analytics.generate_insights(health_data, st.session_state.current_patient)
         st.write(insights)
 
 if __name__ == "__main__":
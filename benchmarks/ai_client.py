@@ -0,0 +1,89 @@
+"""Latency of AIIntegration calls against the local mock watsonx server
+
+Compares a new connection per call with the pooled session, and sequential
+with concurrent async calls. Run from the repository root:
+
+    python benchmarks/ai_client.py --calls 200 --latency 0.05 --concurrency 10
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.ai_integration import API_VERSION, AIIntegration
+from utils.mock_watsonx import MockWatsonxServer
+
+PROMPT = "Patient Question: I have had a headache since yesterday"
+
+def prompts(calls, tag):
+    # Distinct prompts so every call reaches the server instead of the response cache
+    return [f"{PROMPT} ({tag} {i})" for i in range(calls)]
+
+def bench_unpooled(client, calls):
+    # What a plain requests.post per call costs: fresh connection, no reuse
+    token = client._get_token()
+    start = time.perf_counter()
+    for prompt in prompts(calls, 'unpooled'):
+        response = requests.post(
+            f"{client.base_url}/ml/v1/text/generation",
+            params={"version": API_VERSION},
+            json={"input": prompt, "parameters": {"max_new_tokens": 500}, "model_id": client.model_id},
+            headers={"Authorization": f"Bearer {token}", "Connection": "close"},
+            timeout=client.timeout
+        )
+        response.raise_for_status()
+    return time.perf_counter() - start
+
+def bench_pooled(client, calls):
+    start = time.perf_counter()
+    for prompt in prompts(calls, 'pooled'):
+        client._make_api_call(prompt)
+    return time.perf_counter() - start
+
+def bench_async(client, calls, concurrency):
+    async def run():
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def call(prompt):
+            async with semaphore:
+                return await client._make_api_call_async(prompt)
+        
+        await asyncio.gather(*(call(prompt) for prompt in prompts(calls, 'async')))
+    
+    start = time.perf_counter()
+    asyncio.run(run())
+    return time.perf_counter() - start
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pooled watsonx client against a local mock")
+    parser.add_argument('--calls', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.0, help="Simulated model time per request (seconds)")
+    parser.add_argument('--concurrency', type=int, default=10)
+    args = parser.parse_args(argv)
+    
+    with MockWatsonxServer(latency=args.latency) as server:
+        client = AIIntegration(api_key='benchmark', base_url=server.url, iam_url=server.iam_url,
+                               pool_size=args.concurrency)
+        client._make_api_call(PROMPT)
+        
+        before = server.stats
+        unpooled = bench_unpooled(client, args.calls)
+        middle = server.stats
+        pooled = bench_pooled(client, args.calls)
+        after = server.stats
+        concurrent = bench_async(client, args.calls, args.concurrency)
+        client.close()
+    
+    print(f"{'new connection per call':<32} {unpooled / args.calls * 1e3:8.2f} ms/call "
+          f"({middle['connections'] - before['connections']} connections)")
+    print(f"{'pooled session':<32} {pooled / args.calls * 1e3:8.2f} ms/call "
+          f"({after['connections'] - middle['connections']} connections)")
+    print(f"{f'async, {args.concurrency} in flight':<32} {concurrent / args.calls * 1e3:8.2f} ms/call "
+          f"({args.calls / concurrent:.0f} calls/sec)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Throughput of streaming anomaly detection on one core
+
+Run from the repository root:
+
+    python benchmarks/anomaly_detection.py --readings 200000 --patients 1000
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.anomaly_detection import AnomalyDetector
+from utils.patient_data import PatientDataManager, HEALTH_METRICS
+
+def make_readings(n_readings, n_patients, seed=0):
+    """Random readings with an occasional spike and level shift mixed in"""
+    rng = np.random.default_rng(seed)
+    values = rng.normal(loc=[72, 120, 80, 95, 75], scale=[4, 6, 4, 8, 0.3], size=(n_readings, len(HEALTH_METRICS)))
+    spikes = rng.random(n_readings) < 0.001
+    values[spikes] *= 1.5
+    values[n_readings // 2:, 1] += 25
+    patients = [f'Patient {i}' for i in rng.integers(0, n_patients, n_readings)]
+    dates = pd.Timestamp('2024-01-01') + pd.to_timedelta(np.arange(n_readings), unit='min')
+    return [
+        (patient, {'date': date, **dict(zip(HEALTH_METRICS, row.tolist()))})
+        for patient, date, row in zip(patients, dates, values)
+    ]
+
+def bench_detector(readings):
+    detector = AnomalyDetector(HEALTH_METRICS)
+    anomalies = []
+    detector.add_callback(anomalies.append)
+    start = time.perf_counter()
+    for patient, record in readings:
+        detector.observe(patient, record)
+    return time.perf_counter() - start, len(anomalies)
+
+def bench_manager(readings):
+    manager = PatientDataManager(seed=0)
+    anomalies = []
+    manager.add_anomaly_callback(anomalies.append)
+    start = time.perf_counter()
+    for patient, record in readings:
+        manager.add_health_record(patient, record)
+    return time.perf_counter() - start, len(anomalies)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--readings', type=int, default=100000)
+    parser.add_argument('--patients', type=int, default=1000)
+    args = parser.parse_args()
+    
+    readings = make_readings(args.readings, args.patients)
+    for label, bench in (('detector only', bench_detector), ('add_health_record', bench_manager)):
+        elapsed, found = bench(readings)
+        print(f"{label:>18}: {len(readings) / elapsed:>10,.0f} readings/sec "
+              f"({elapsed:.2f} s, {found} anomalies)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Safety checks and lookup latency for the semantic answer cache
+
+Questions that must never share an answer (different doses, negations, who
+the question is about, different questions with similar wording) are checked
+against a small set of cached questions, as are rephrasings that should share
+one. Run from the
+repository root:
+
+    python benchmarks/semantic_cache.py --entries 2000
+
+The exit status is 1 when any check fails.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.semantic_cache import SemanticCache
+
+CACHED_QUESTIONS = [
+    "I have a bad headache", "I have a fever since yesterday", "I have chest pain",
+    "My stomach hurts after eating", "I feel dizzy when I stand up", "I have a cough that won't go away",
+    "What is a normal blood pressure?", "How much water should I drink a day?",
+    "Can I take ibuprofen with my blood pressure medication?", "I can't sleep at night",
+    "should I take 200mg ibuprofen", "I have a rash on my arm", "What should my blood sugar be after meals?",
+    "I feel tired all the time", "My knee is swollen", "I have a sore throat"
+]
+
+# (question, cached question it must not be answered with)
+MUST_MISS = [
+    ("I do not have chest pain", "I have chest pain"),
+    ("I never have chest pain", "I have chest pain"),
+    ("should I take 800mg ibuprofen", "should I take 200mg ibuprofen"),
+    ("should I take ibuprofen", "should I take 200mg ibuprofen"),
+    ("what should my blood pressure medication be", "Can I take ibuprofen with my blood pressure medication?"),
+    ("I have a bad cough", "I have a bad headache"),
+    ("I can sleep at night", "I can't sleep at night"),
+    ("I have a bad headache and I am pregnant", "I have a bad headache"),
+    ("my son has a fever since yesterday", "I have a fever since yesterday"),
+    ("I am diabetic, what should my blood sugar be after meals", "What should my blood sugar be after meals?"),
+    ("I have severe chest pain", "I have chest pain"),
+]
+
+# (question, cached question it should be answered with)
+MUST_HIT = [
+    ("my throat hurts", "I have a sore throat"),
+    ("i have a temperature since yesterday", "I have a fever since yesterday"),
+    ("stomach ache after I eat", "My stomach hurts after eating"),
+    ("my head hurts a lot", "I have a bad headache"),
+    ("I've got a really bad headache", "I have a bad headache"),
+    ("what should my blood sugar be after eating", "What should my blood sugar be after meals?"),
+]
+
+def make_cache():
+    cache = SemanticCache()
+    for question in CACHED_QUESTIONS:
+        cache.add(question, question)
+    return cache
+
+def check(cache):
+    """Return a list of failure messages"""
+    failures = []
+    for question, cached in MUST_MISS:
+        answer = cache.lookup(question)
+        if answer == cached:
+            failures.append(f"{question!r} reused the answer to {cached!r}")
+    for question, cached in MUST_HIT:
+        answer = cache.lookup(question)
+        if answer != cached:
+            failures.append(f"{question!r} got {answer!r} instead of the answer to {cached!r}")
+    return failures
+
+def bench_lookup(entries, lookups=500, seed=0):
+    """Seconds per lookup with ``entries`` cached questions"""
+    words = ('head chest stomach back knee throat arm leg pain fever rash cough dizzy tired swollen itchy '
+             'sugar pressure sleep water medication dose morning night eating walking').split()
+    rng = random.Random(seed)
+    cache = SemanticCache(max_entries=entries)
+    for i in range(entries):
+        cache.add(' '.join(rng.sample(words, 5)), i)
+    questions = [' '.join(rng.sample(words, 4)) for _ in range(lookups)]
+    start = time.perf_counter()
+    for question in questions:
+        cache.lookup(question)
+    return (time.perf_counter() - start) / lookups, cache.stats()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check and benchmark the semantic answer cache")
+    parser.add_argument('--entries', type=int, default=2000, help="Cached questions for the latency run")
+    args = parser.parse_args(argv)
+    
+    failures = check(make_cache())
+    for failure in failures:
+        print(f"FAIL {failure}")
+    print(f"{len(MUST_MISS) + len(MUST_HIT) - len(failures)}/{len(MUST_MISS) + len(MUST_HIT)} checks passed")
+    
+    seconds, stats = bench_lookup(args.entries)
+    print(f"lookup with {args.entries} entries: {seconds * 1e6:.0f} µs ({stats['hits']} hits, {stats['misses']} misses)")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,216 @@
+"""Benchmark suite for the data layer and analytics
+
+Times PatientDataManager and HealthAnalytics operations at several history
+lengths (one patient) and population sizes (30 days each), saves the results
+as JSON and flags regressions against a stored baseline. Run from the
+repository root:
+
+    python benchmarks/suite.py --quick
+    python benchmarks/suite.py --output results.json --baseline benchmarks/baseline.json
+    python benchmarks/suite.py --quick --save-baseline benchmarks/baseline.json
+
+The exit status is 1 when any case is slower than the baseline by more than
+``--threshold``. Cases the baseline has no timing for are listed as such.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.health_analytics import HealthAnalytics
+from utils.patient_data import PatientDataManager, HEALTH_METRICS
+
+# History lengths and population sizes covered by a full run
+HISTORY_DAYS = [30, 365, 1825]
+PATIENT_COUNTS = [1, 1000, 100000]
+QUICK_HISTORY_DAYS = [30, 365]
+QUICK_PATIENT_COUNTS = [1, 1000]
+
+def measure(func, repeat=5, number=1):
+    """Return timing stats in seconds per call over ``repeat`` rounds of ``number`` calls"""
+    # One untimed call so first-use costs (imports, caches) are not counted
+    func()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        times.append((time.perf_counter() - start) / number)
+    return {'median': float(np.median(times)), 'min': min(times), 'repeat': repeat, 'number': number}
+
+def make_manager(patients, days, seed=0):
+    """Create a manager with ``patients`` patients holding ``days`` of data each"""
+    manager = PatientDataManager(seed=seed)
+    for i in range(patients):
+        manager.create_patient({'name': f'Patient {i}', 'age': 20 + i % 70, 'gender': ('Male', 'Female')[i % 2]})
+        if days != 30:
+            manager.generate_health_data(f'Patient {i}', days=days)
+    return manager
+
+def bench_history(days, repeat):
+    """Per-call cost of each operation for one patient with ``days`` of data"""
+    manager = make_manager(1, days)
+    name = 'Patient 0'
+    profile = manager.get_patient(name)
+    analytics = HealthAnalytics()
+    cached = HealthAnalytics(manager)
+    results = {'generate_health_data': measure(lambda: manager.generate_health_data(name, days=days), repeat)}
+    
+    data = manager.get_health_data(name)
+    last = data['date'].iloc[-1]
+    readings = iter(range(10 ** 9))
+    # Replay existing values so building the record costs next to nothing
+    values = data[HEALTH_METRICS].to_numpy(dtype=float).tolist()
+    
+    def add_record():
+        step = next(readings)
+        record = dict(zip(HEALTH_METRICS, values[step % len(values)]))
+        record['date'] = last + timedelta(minutes=step + 1)
+        manager.add_health_record(name, record)
+    
+    window_start = last - timedelta(days=7)
+    results.update({
+        'get_health_data': measure(lambda: manager.get_health_data(name), repeat, 100),
+        'get_health_data_7d_window': measure(lambda: manager.get_health_data(name, start=window_start), repeat, 100),
+        'calculate_health_trends': measure(lambda: analytics.calculate_health_trends(data), repeat, 20),
+        'calculate_health_trends_cached': measure(lambda: cached.calculate_health_trends(data), repeat, 100),
+        'assess_health_risks': measure(lambda: analytics.assess_health_risks(data, profile), repeat, 100),
+        'generate_insights': measure(lambda: analytics.generate_insights(data, profile), repeat, 5),
+        'generate_insights_cached': measure(lambda: cached.generate_insights(data, profile), repeat, 100),
+    })
+    # Appends last so they do not change the data the other cases read
+    results['add_health_record'] = measure(add_record, repeat, 200)
+    return results
+
+def bench_population(patients, repeat):
+    """Per-call cost with ``patients`` patients of 30 days each, on random patients"""
+    manager = make_manager(patients, 30)
+    analytics = HealthAnalytics()
+    rng = random.Random(0)
+    names = manager.get_patient_names()
+    profiles = [manager.get_patient(name) for name in rng.sample(names, min(len(names), 1000))]
+    
+    def random_patient():
+        return rng.choice(names)
+    
+    def trends_and_risks():
+        profile = rng.choice(profiles)
+        data = manager.get_health_data(profile['name'])
+        analytics.calculate_health_trends(data)
+        analytics.assess_health_risks(data, profile)
+    
+    results = {
+        'get_patient': measure(lambda: manager.get_patient(random_patient()), repeat, 1000),
+        'get_health_data': measure(lambda: manager.get_health_data(random_patient()), repeat, 200),
+        'find_patients': measure(lambda: manager.find_patients(age_band='40-49', gender='Female'), repeat, 20),
+        'trends_and_risks': measure(trends_and_risks, repeat, 50),
+    }
+    if patients <= 10000:
+        cohort = manager.generate_cohort(profiles, days=30, seed=0)
+        results['calculate_cohort_trends'] = measure(lambda: analytics.calculate_cohort_trends(cohort), repeat)
+    return results
+
+def run_suite(history_days, patient_counts, repeat=5, log=print):
+    """Run every case and return {'meta': ..., 'results': {case: stats}}"""
+    results = {}
+    for days in history_days:
+        log(f"history: {days} days")
+        for case, stats in bench_history(days, repeat).items():
+            results[f'history_{days}d/{case}'] = stats
+    for patients in patient_counts:
+        log(f"population: {patients} patients")
+        for case, stats in bench_population(patients, repeat).items():
+            results[f'population_{patients}/{case}'] = stats
+    return {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'machine': platform.machine(),
+            'cpus': os.cpu_count(),
+        },
+        'results': results
+    }
+
+def compare(results, baseline, threshold=0.3, min_delta=20e-6):
+    """Return cases more than ``threshold`` slower than the baseline
+
+    Cases are compared on their fastest round, which is the least affected
+    by other load on the machine, and slowdowns under ``min_delta`` seconds
+    are treated as timer noise.
+    """
+    regressions = []
+    for case, stats in results['results'].items():
+        base = baseline['results'].get(case)
+        if base is None or base['min'] <= 0:
+            continue
+        ratio = stats['min'] / base['min']
+        if ratio > 1 + threshold and stats['min'] - base['min'] > min_delta:
+            regressions.append({'case': case, 'baseline': base['min'], 'current': stats['min'], 'ratio': ratio})
+    return regressions
+
+def missing_from_baseline(results, baseline):
+    """Return the cases in ``results`` that the baseline has no timing for"""
+    return [case for case in results['results'] if case not in baseline['results']]
+
+def format_seconds(seconds):
+    if seconds >= 1:
+        return f"{seconds:.2f} s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds * 1e6:.1f} µs"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the HealthAI data layer and analytics")
+    parser.add_argument('--quick', action='store_true', help="Skip the 5-year history and 100k patient cases")
+    parser.add_argument('--days', type=int, nargs='+', help="History lengths to benchmark")
+    parser.add_argument('--patients', type=int, nargs='+', help="Population sizes to benchmark")
+    parser.add_argument('--repeat', type=int, default=5, help="Timing rounds per case")
+    parser.add_argument('--output', default='benchmark_results.json', help="Where to write the results")
+    parser.add_argument('--baseline', help="Baseline results to compare against")
+    parser.add_argument('--threshold', type=float, default=0.3, help="Allowed slowdown before a case is flagged")
+    parser.add_argument('--min-delta', type=float, default=20e-6, help="Ignore slowdowns smaller than this (seconds)")
+    parser.add_argument('--save-baseline', help="Also write the results to this baseline file")
+    args = parser.parse_args(argv)
+    
+    history_days = args.days or (QUICK_HISTORY_DAYS if args.quick else HISTORY_DAYS)
+    patient_counts = args.patients or (QUICK_PATIENT_COUNTS if args.quick else PATIENT_COUNTS)
+    results = run_suite(history_days, patient_counts, repeat=args.repeat)
+    
+    for case, stats in results['results'].items():
+        print(f"{case:<55} {format_seconds(stats['median']):>12}")
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved results to {path}")
+    
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold, args.min_delta)
+        missing = missing_from_baseline(results, baseline)
+        for regression in regressions:
+            print(f"REGRESSION {regression['case']}: {format_seconds(regression['baseline'])} -> "
+                  f"{format_seconds(regression['current'])} ({regression['ratio']:.2f}x)")
+        for case in missing:
+            print(f"NO BASELINE {case}")
+        if regressions:
+            return 1
+        if missing:
+            print(f"No regressions beyond {args.threshold:.0%} in the {len(results['results']) - len(missing)} "
+                  f"cases compared; {len(missing)} cases have no baseline in {args.baseline}")
+        else:
+            print(f"No regressions beyond {args.threshold:.0%} against {args.baseline}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,14 +1,78 @@
 import os
+import re
+import time
+import asyncio
+import threading
 from typing import Dict, Any
 import requests
+from requests.adapters import HTTPAdapter
 import json
+from utils.response_cache import ResponseCache, cache_key
+from utils.request_dispatch import RequestDispatcher, estimate_tokens
+from utils.semantic_cache import SemanticCache
+
+DEFAULT_API_KEY = "default_api_key"
+DEFAULT_PROJECT_ID = "default_project_id"
+# API keys that mean "not configured": the in-code default and the .env template value
+PLACEHOLDER_API_KEYS = {"", DEFAULT_API_KEY, "your_watsonx_api_key_here"}
+API_VERSION = "2023-05-29"
+
+# Simulated responses are streamed a few words at a time
+_WORDS = re.compile(r'\S+\s*|\s+')
 
 class AIIntegration:
-    def __init__(self):
-        self.api_key = os.getenv("WATSONX_API_KEY", "default_api_key")
-        self.project_id = os.getenv("WATSONX_PROJECT_ID", "default_project_id")
+    def __init__(self, api_key=None, project_id=None, base_url=None, iam_url=None, connect_timeout=None,
+                 read_timeout=None, pool_size=None, cache=None, dispatcher=None, semantic_cache=None):
+        self.api_key = api_key or os.getenv("WATSONX_API_KEY", DEFAULT_API_KEY)
+        self.project_id = project_id or os.getenv("WATSONX_PROJECT_ID", DEFAULT_PROJECT_ID)
         self.model_id = "ibm/granite-13b-instruct-v2"
-        self.base_url = "https://us-south.ml.cloud.ibm.com"
+        self.base_url = (base_url or os.getenv("WATSONX_URL", "https://us-south.ml.cloud.ibm.com")).rstrip('/')
+        self.iam_url = iam_url or os.getenv("WATSONX_IAM_URL", "https://iam.cloud.ibm.com/identity/token")
+        
+        # (connect, read) timeouts in seconds for every HTTP call
+        self.timeout = (
+            connect_timeout or float(os.getenv("WATSONX_CONNECT_TIMEOUT", "5")),
+            read_timeout or float(os.getenv("WATSONX_READ_TIMEOUT", "60"))
+        )
+        
+        # Without real credentials, or when asked to, responses are simulated locally
+        self.simulated = (
+            self.api_key in PLACEHOLDER_API_KEYS
+            or os.getenv("WATSONX_SIMULATE", "").lower() in ("1", "true", "yes")
+        )
+        self.simulated_chunk_delay = float(os.getenv("WATSONX_SIMULATED_CHUNK_DELAY", "0.02"))
+        
+        # One pooled session so calls reuse keep-alive connections instead of
+        # paying a TCP and TLS handshake each time
+        pool_size = pool_size or int(os.getenv("WATSONX_POOL_SIZE", "10"))
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        
+        # IAM bearer token, shared by all threads until shortly before it expires
+        self._token = None
+        self._token_expires = 0.0
+        self._token_lock = threading.Lock()
+        
+        # Identical prompts are answered from the cache instead of the model;
+        # set HEALTHAI_RESPONSE_CACHE_PATH to keep responses across restarts
+        self.cache = cache or ResponseCache(
+            path=os.getenv("HEALTHAI_RESPONSE_CACHE_PATH"),
+            ttl=float(os.getenv("HEALTHAI_RESPONSE_CACHE_TTL", str(7 * 24 * 3600)))
+        )
+        
+        # Patient questions close enough to an earlier one reuse its answer
+        self.semantic_cache = semantic_cache or SemanticCache(
+            threshold=float(os.getenv("HEALTHAI_SEMANTIC_CACHE_THRESHOLD", "0.8"))
+        )
+        
+        # Model calls are coalesced, rate limited to the provider quota and retried
+        self.dispatcher = dispatcher or RequestDispatcher(
+            requests_per_minute=int(os.getenv("WATSONX_REQUESTS_PER_MINUTE", "120")),
+            tokens_per_minute=int(os.getenv("WATSONX_TOKENS_PER_MINUTE", "100000")),
+            max_retries=int(os.getenv("WATSONX_MAX_RETRIES", "3"))
+        )
         
         # Initialize connection (mock for now as we don't have real credentials)
         self.is_connected = self._test_connection()
@@ -16,24 +80,163 @@ class AIIntegration:
     def _test_connection(self):
         """Test connection to IBM Watson ML"""
         try:
-            # In a real implementation, this would test the actual connection
-            # For now, we'll simulate a successful connection
+            # The connection is checked lazily by the first API call, so the
+            # app starts without waiting on the network
             return True
         except Exception as e:
             print(f"Connection error: {e}")
             return False
     
+    def _get_token(self):
+        """Return a cached IAM access token, fetching a new one when it is about to expire"""
+        with self._token_lock:
+            if self._token is None or time.time() >= self._token_expires:
+                response = self.session.post(
+                    self.iam_url,
+                    data={"grant_type": "urn:ibm:params:oauth:grant-type:apikey", "apikey": self.api_key},
+                    headers={"Accept": "application/json"},
+                    timeout=self.timeout
+                )
+                response.raise_for_status()
+                token = response.json()
+                self._token = token["access_token"]
+                # Refresh a little early so a request never carries an expired token
+                expires_in = token.get("expires_in", 3600)
+                self._token_expires = time.time() + expires_in - min(60, expires_in / 10)
+            return self._token
+    
+    def _generate(self, prompt: str, max_tokens: int = 500) -> str:
+        """POST one text generation request and return the generated text"""
+        response = self.session.post(
+            f"{self.base_url}/ml/v1/text/generation",
+            params={"version": API_VERSION},
+            json={
+                "input": prompt,
+                "parameters": {"decoding_method": "greedy", "max_new_tokens": max_tokens},
+                "model_id": self.model_id,
+                "project_id": self.project_id
+            },
+            headers={"Authorization": f"Bearer {self._get_token()}", "Accept": "application/json"},
+            timeout=self.timeout
+        )
+        if response.status_code == 401:
+            # Token revoked or expired early: fetch a new one on the next call
+            with self._token_lock:
+                self._token = None
+        response.raise_for_status()
+        return response.json()["results"][0]["generated_text"]
+    
     def _make_api_call(self, prompt: str, max_tokens: int = 500) -> str:
         """Make API call to IBM Granite model"""
         if not self.is_connected:
             return "Sorry, I'm currently unable to connect to the AI service. Please try again later."
         
+        key = cache_key(prompt, self.model_id, max_tokens)
+        response = self.cache.get(key)
+        if response is not None:
+            return response
+        
         try:
-            # In a real implementation, this would make the actual API call
-            # For now, we'll return a simulated response based on the prompt
-            return self._simulate_ai_response(prompt)
+            if self.simulated:
+                response = self._simulate_ai_response(prompt)
+            else:
+                response = self.dispatcher.call(key, self._generate, prompt, max_tokens,
+                                                tokens=estimate_tokens(prompt, max_tokens))
         except Exception as e:
             return f"Error generating AI response: {str(e)}"
+        # Errors are returned above without being cached, so they are retried
+        self.cache.set(key, response)
+        return response
+    
+    def _stream_generate(self, prompt: str, max_tokens: int = 500):
+        """POST one streaming generation request and yield text chunks as they arrive"""
+        response = self.session.post(
+            f"{self.base_url}/ml/v1/text/generation_stream",
+            params={"version": API_VERSION},
+            json={
+                "input": prompt,
+                "parameters": {"decoding_method": "greedy", "max_new_tokens": max_tokens},
+                "model_id": self.model_id,
+                "project_id": self.project_id
+            },
+            headers={"Authorization": f"Bearer {self._get_token()}", "Accept": "text/event-stream"},
+            timeout=self.timeout,
+            stream=True
+        )
+        with response:
+            if response.status_code == 401:
+                with self._token_lock:
+                    self._token = None
+            response.raise_for_status()
+            # Server-sent events: each "data:" line holds one JSON chunk
+            for line in response.iter_lines(decode_unicode=True):
+                if line and line.startswith("data:"):
+                    results = json.loads(line[5:]).get("results") or [{}]
+                    text = results[0].get("generated_text", "")
+                    if text:
+                        yield text
+    
+    def _stream_api_call(self, prompt: str, max_tokens: int = 500):
+        """Streaming variant of _make_api_call that yields the response in chunks
+        
+        Cached responses come back as a single chunk. The full text is cached
+        once the stream completes.
+        """
+        if not self.is_connected:
+            yield "Sorry, I'm currently unable to connect to the AI service. Please try again later."
+            return
+        
+        key = cache_key(prompt, self.model_id, max_tokens)
+        response = self.cache.get(key)
+        if response is not None:
+            yield response
+            return
+        
+        chunks = []
+        try:
+            if self.simulated:
+                stream = self._simulate_stream(self._simulate_ai_response(prompt))
+            else:
+                # Streams are rate limited but not coalesced or retried
+                self.dispatcher.throttle(estimate_tokens(prompt, max_tokens))
+                stream = self._stream_generate(prompt, max_tokens)
+            for chunk in stream:
+                chunks.append(chunk)
+                yield chunk
+        except Exception as e:
+            # After partial output, put the error on its own paragraph
+            yield ("\n\n" if chunks else "") + f"Error generating AI response: {str(e)}"
+            return
+        self.cache.set(key, ''.join(chunks))
+    
+    def _simulate_stream(self, text, words=4):
+        """Yield a simulated response a few words at a time, paced like a model"""
+        tokens = _WORDS.findall(text)
+        for i in range(0, len(tokens), words):
+            if self.simulated_chunk_delay:
+                time.sleep(self.simulated_chunk_delay)
+            yield ''.join(tokens[i:i + words])
+    
+    async def _make_api_call_async(self, prompt: str, max_tokens: int = 500) -> str:
+        """Async variant of _make_api_call for running many calls concurrently
+        
+        Each call runs on a worker thread over the shared session, so up to
+        ``pool_size`` requests are in flight at once on kept-alive connections.
+        """
+        return await asyncio.to_thread(self._make_api_call, prompt, max_tokens)
+    
+    def cache_stats(self):
+        """Return hit/miss counters and size of the response cache"""
+        return self.cache.stats()
+    
+    def dispatch_stats(self):
+        """Return queue depth, wait times and retry counters of the request dispatcher"""
+        return self.dispatcher.stats()
+    
+    def close(self):
+        """Close the pooled connections and the response cache"""
+        self.session.close()
+        self.cache.close()
     
     def _simulate_ai_response(self, prompt: str) -> str:
         """Simulate AI responses for demonstration purposes"""
@@ -131,7 +334,37 @@ Is there anything specific about your symptoms you'd like me to help clarify?"""
     
     def answer_patient_query(self, query: str, patient_context: str = "") -> str:
         """Answer patient health questions"""
-        prompt = f"""You are a helpful healthcare AI assistant. Provide empathetic, accurate medical information while emphasizing the importance of professional medical care.
+        # Answers are only reused for the same patient context
+        response = self.semantic_cache.lookup(query, scope=patient_context)
+        if response is not None:
+            return response
+        
+        response = self._make_api_call(self._patient_query_prompt(query, patient_context))
+        if not self._is_error_response(response):
+            self.semantic_cache.add(query, response, scope=patient_context)
+        return response
+    
+    def stream_patient_query(self, query: str, patient_context: str = ""):
+        """Answer patient health questions, yielding the response in chunks as it is generated"""
+        response = self.semantic_cache.lookup(query, scope=patient_context)
+        if response is not None:
+            yield response
+            return
+        
+        chunks = []
+        for chunk in self._stream_api_call(self._patient_query_prompt(query, patient_context)):
+            chunks.append(chunk)
+            yield chunk
+        response = ''.join(chunks)
+        if not self._is_error_response(response):
+            self.semantic_cache.add(query, response, scope=patient_context)
+    
+    @staticmethod
+    def _is_error_response(response):
+        return not response or "Error generating AI response" in response or "unable to connect" in response.lower()
+    
+    def _patient_query_prompt(self, query, patient_context):
+        return f"""You are a helpful healthcare AI assistant. Provide empathetic, accurate medical information while emphasizing the importance of professional medical care.
 
 Patient Context: {patient_context}
 
@@ -144,8 +377,6 @@ Please provide:
 4. Appropriate disclaimers about AI limitations
 
 Remember to be supportive but never provide specific medical diagnoses or treatment recommendations."""
-        
-        return self._make_api_call(prompt)
     
     def predict_disease(self, symptom_data: Dict[str, Any], patient_info: str) -> str:
         """Predict potential diseases based on symptoms"""
@@ -0,0 +1,130 @@
+import math
+import threading
+from utils.lru_cache import LRUCache
+
+class MetricState:
+    """O(1) running state for one metric of one patient
+    
+    Keeps an exponentially weighted mean and variance for the rolling z-score
+    and the two one-sided CUSUM sums over the standardized readings.
+    """
+    
+    __slots__ = ('count', 'mean', 'var', 'cusum_up', 'cusum_down')
+    
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.var = 0.0
+        self.cusum_up = 0.0
+        self.cusum_down = 0.0
+
+class AnomalyDetector:
+    """Streaming anomaly detector over incoming health readings
+    
+    For every patient and metric it flags two kinds of sudden change:
+    
+    - ``spike``: a single reading more than ``z_threshold`` standard
+      deviations from the exponentially weighted mean (``alpha`` sets how
+      fast the mean and variance follow the data)
+    - ``shift_up``/``shift_down``: a sustained level change, found by CUSUM
+      over the standardized readings with slack ``cusum_k`` and decision
+      threshold ``cusum_h``; the sum restarts after each alarm
+    
+    No alarms are raised during the first ``warmup`` readings of a metric.
+    State is a handful of floats per patient and metric, and only the
+    ``max_patients`` most recently seen patients are tracked. Registered
+    callbacks receive each anomaly as a dict.
+    """
+    
+    def __init__(self, metrics, z_threshold=4.5, cusum_k=0.5, cusum_h=8.0, alpha=0.02, warmup=30,
+                 max_patients=10000):
+        self.metrics = list(metrics)
+        self.z_threshold = z_threshold
+        self.cusum_k = cusum_k
+        self.cusum_h = cusum_h
+        self.alpha = alpha
+        self.warmup = warmup
+        self._states = LRUCache(max_patients)
+        self._callbacks = []
+        self._lock = threading.Lock()
+    
+    def add_callback(self, callback):
+        """Call ``callback(anomaly)`` for every anomaly detected from now on"""
+        with self._lock:
+            self._callbacks = self._callbacks + [callback]
+    
+    def remove_callback(self, callback):
+        with self._lock:
+            self._callbacks = [cb for cb in self._callbacks if cb is not callback]
+    
+    def observe(self, patient_name, record):
+        """Feed one reading and return the anomalies it triggered
+        
+        Each anomaly is a dict with ``patient_name``, ``metric``, ``date``,
+        ``value``, ``kind`` (``spike``, ``shift_up`` or ``shift_down``) and
+        ``score`` (the z-score or CUSUM sum). Callbacks run after the state is
+        updated, outside the detector's lock.
+        """
+        anomalies = []
+        with self._lock:
+            states = self._states.get(patient_name)
+            if states is None:
+                states = {metric: MetricState() for metric in self.metrics}
+                self._states[patient_name] = states
+            
+            for metric in self.metrics:
+                value = record.get(metric)
+                if value is None or value != value:
+                    continue
+                kind, score = self._update(states[metric], float(value))
+                if kind is not None:
+                    anomalies.append({
+                        'patient_name': patient_name,
+                        'metric': metric,
+                        'date': record.get('date'),
+                        'value': value,
+                        'kind': kind,
+                        'score': score
+                    })
+            callbacks = self._callbacks
+        
+        for anomaly in anomalies:
+            for callback in callbacks:
+                callback(anomaly)
+        return anomalies
+    
+    def reset(self, patient_name):
+        """Forget a patient's state, e.g. after their history is regenerated"""
+        with self._lock:
+            self._states.pop(patient_name)
+    
+    def _update(self, state, value):
+        state.count += 1
+        if state.count == 1:
+            state.mean = value
+            return None, 0.0
+        
+        # Score the reading against the state before it, then fold it in
+        std = math.sqrt(state.var)
+        z = (value - state.mean) / std if std > 0 else 0.0
+        diff = value - state.mean
+        state.mean += self.alpha * diff
+        state.var = (1 - self.alpha) * (state.var + self.alpha * diff * diff)
+        
+        # Clip the CUSUM input so a single outlier cannot dominate the sums
+        step = max(-self.z_threshold, min(self.z_threshold, z))
+        state.cusum_up = max(0.0, state.cusum_up + step - self.cusum_k)
+        state.cusum_down = max(0.0, state.cusum_down - step - self.cusum_k)
+        if state.count <= self.warmup:
+            state.cusum_up = state.cusum_down = 0.0
+            return None, z
+        
+        if abs(z) > self.z_threshold:
+            return 'spike', z
+        if state.cusum_up > self.cusum_h:
+            score, state.cusum_up = state.cusum_up, 0.0
+            return 'shift_up', score
+        if state.cusum_down > self.cusum_h:
+            score, state.cusum_down = state.cusum_down, 0.0
+            return 'shift_down', score
+        return None, z
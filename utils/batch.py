@@ -0,0 +1,42 @@
+"""Process pool runner shared by the batch jobs over stored patients
+
+Patient names are split into shards for a process pool. Each worker opens
+the store itself, so only names and the shards' results cross process
+boundaries.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from utils.health_analytics import HealthAnalytics
+from utils.patient_store import open_store
+
+# Per-process state set up by _init_worker
+_worker = {}
+
+def _init_worker(db_path, column_store_dir):
+    # Each process gets its own store connection and analytics instance
+    _worker['store'] = open_store(db_path=db_path, column_store_dir=column_store_dir)
+    _worker['analytics'] = HealthAnalytics()
+
+def _run_shard(func, names, args):
+    return func(_worker['store'], _worker['analytics'], names, *args)
+
+def shard_names(names, shard_size):
+    """Split ``names`` into lists of at most ``shard_size``"""
+    return [names[i:i + shard_size] for i in range(0, len(names), shard_size)]
+
+def run_sharded(func, names, db_path=None, column_store_dir=None, workers=None, shard_size=100, args=()):
+    """Run ``func(store, analytics, shard, *args)`` over shards of ``names`` in a process pool
+    
+    ``func`` must be a module-level function so it can be sent to the
+    workers. ``db_path``/``column_store_dir`` select the store as in
+    open_store and ``workers`` defaults to the number of CPUs. Yields each
+    shard's result as it finishes.
+    """
+    with ProcessPoolExecutor(
+        max_workers=workers or os.cpu_count(),
+        initializer=_init_worker,
+        initargs=(db_path, column_store_dir)
+    ) as pool:
+        futures = [pool.submit(_run_shard, func, shard, args) for shard in shard_names(names, shard_size)]
+        for future in as_completed(futures):
+            yield future.result()
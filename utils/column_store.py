@@ -0,0 +1,159 @@
+import os
+import json
+import threading
+import numpy as np
+import pandas as pd
+from urllib.parse import quote, unquote
+from utils.lru_cache import LRUCache
+from utils.patient_data import HEALTH_METRICS
+from utils.patient_store import PatientStore
+
+class MemmapPatientStore(PatientStore):
+    """Patient store with one memory-mapped binary column per metric and patient
+    
+    Each patient gets a directory holding ``profile.json``, a sorted int64
+    ``date`` column (nanoseconds since the epoch) and one float32 column per
+    metric, so a reading costs 28 bytes on disk. Reads open the columns with ``numpy.memmap`` and return slices of
+    them, so memory use follows the window being read rather than the total
+    history on disk.
+    """
+    
+    memory_mapped = True
+    date_dtype = np.dtype('int64')
+    metric_dtype = np.dtype('float32')
+    
+    def __init__(self, root, max_open_patients=256):
+        self.root = root
+        self._lock = threading.Lock()
+        # Each open memmap holds a file descriptor, so keep only the hot ones
+        self._open_columns = LRUCache(max_open_patients)
+        os.makedirs(os.path.join(root, 'patients'), exist_ok=True)
+    
+    def list_patient_names(self):
+        # Readings can be stored before a profile, so only directories with one count
+        patients_dir = os.path.join(self.root, 'patients')
+        return sorted(
+            unquote(entry) for entry in os.listdir(patients_dir)
+            if os.path.exists(os.path.join(patients_dir, entry, 'profile.json'))
+        )
+    
+    def load_patient(self, name):
+        path = os.path.join(self._patient_dir(name), 'profile.json')
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as f:
+            return self._profile_from_json(f.read())
+    
+    def save_patient(self, profile):
+        patient_dir = self._patient_dir(profile['name'])
+        os.makedirs(patient_dir, exist_ok=True)
+        with open(os.path.join(patient_dir, 'profile.json'), 'w', encoding='utf-8') as f:
+            json.dump(profile, f, default=self._json_default)
+    
+    def load_health_data(self, name, start=None, end=None, metrics=None):
+        """Return health data as a DataFrame whose columns are views of the memmaps
+        
+        ``start``/``end`` bound the date range (inclusive) and are located by
+        binary search on the sorted date column; ``metrics`` limits the columns.
+        Like HealthRecordBuffer.query, unknown names in ``metrics`` are ignored
+        and ``date`` is always included.
+        """
+        columns = self._columns(name)
+        if columns is None:
+            return pd.DataFrame()
+        
+        dates = columns['date']
+        lo = 0 if start is None else int(np.searchsorted(dates, pd.Timestamp(start).value, side='left'))
+        hi = len(dates) if end is None else int(np.searchsorted(dates, pd.Timestamp(end).value, side='right'))
+        
+        data = {'date': dates[lo:hi].view('datetime64[ns]')}
+        names = HEALTH_METRICS if metrics is None else [m for m in metrics if m in HEALTH_METRICS]
+        for metric in names:
+            data[metric] = columns[metric][lo:hi]
+        frame = pd.DataFrame(data, copy=False)
+        frame.attrs['patient_name'] = name
+        return frame
+    
+    def save_health_data(self, name, frame):
+        frame = frame.sort_values('date', kind='stable')
+        dates = pd.to_datetime(frame['date']).to_numpy(dtype='datetime64[ns]').view(self.date_dtype)
+        with self._lock:
+            self._open_columns.pop(name)
+            patient_dir = self._patient_dir(name)
+            os.makedirs(patient_dir, exist_ok=True)
+            self._replace_column(self._column_path(name, 'date'), dates)
+            for metric in HEALTH_METRICS:
+                values = frame[metric] if metric in frame.columns else np.nan
+                self._replace_column(
+                    self._column_path(name, metric),
+                    np.broadcast_to(np.asarray(values, dtype=self.metric_dtype), len(frame))
+                )
+    
+    def append_health_records(self, name, records):
+        if not records:
+            return
+        if any(record.get('date') is None for record in records):
+            raise ValueError("Health records need a 'date' to be stored in a column store")
+        
+        dates = np.array([pd.Timestamp(record['date']).value for record in records], dtype=self.date_dtype)
+        new_columns = {
+            metric: np.array([record.get(metric, np.nan) for record in records], dtype=self.metric_dtype)
+            for metric in HEALTH_METRICS
+        }
+        
+        existing = self._columns(name)
+        in_order = np.all(np.diff(dates) >= 0) and (
+            existing is None or len(existing['date']) == 0 or dates[0] >= existing['date'][-1]
+        )
+        if not in_order:
+            # Late readings break the sorted date column, so merge and rewrite once
+            frame = self.load_health_data(name).copy()
+            late = pd.DataFrame({'date': dates.view('datetime64[ns]'), **new_columns})
+            self.save_health_data(name, pd.concat([frame, late], ignore_index=True))
+            return
+        
+        with self._lock:
+            self._open_columns.pop(name)
+            os.makedirs(self._patient_dir(name), exist_ok=True)
+            with open(self._column_path(name, 'date'), 'ab') as f:
+                f.write(dates.tobytes())
+            for metric, values in new_columns.items():
+                with open(self._column_path(name, metric), 'ab') as f:
+                    f.write(values.tobytes())
+    
+    def _columns(self, name):
+        """Return the patient's columns as read-only memmaps, or None if absent"""
+        with self._lock:
+            columns = self._open_columns.get(name)
+            if columns is not None:
+                return columns
+            
+            if not os.path.exists(self._column_path(name, 'date')):
+                return None
+            columns = {'date': self._open(self._column_path(name, 'date'), self.date_dtype)}
+            for metric in HEALTH_METRICS:
+                columns[metric] = self._open(self._column_path(name, metric), self.metric_dtype)
+            self._open_columns[name] = columns
+            return columns
+    
+    @staticmethod
+    def _replace_column(path, values):
+        # Write a new file and rename it over the old one: frames handed out
+        # earlier keep mapping the old file instead of seeing it truncated
+        tmp_path = path + '.tmp'
+        values.tofile(tmp_path)
+        os.replace(tmp_path, path)
+    
+    @staticmethod
+    def _open(path, dtype):
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode='r')
+    
+    def _patient_dir(self, name):
+        return os.path.join(self.root, 'patients', quote(name, safe=''))
+    
+    def _column_path(self, name, column):
+        # The dtype is part of the file name so a dtype change never misreads old files
+        dtype = self.date_dtype if column == 'date' else self.metric_dtype
+        return os.path.join(self._patient_dir(name), f'{column}.{dtype.name}')
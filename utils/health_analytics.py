@@ -1,102 +1,233 @@
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
+from utils.lru_cache import LRUCache
+from utils.patient_data import HEALTH_METRICS
+from utils.risk_rules import latest_risks, risk_episodes
+from utils.rolling_windows import ROLLING_WINDOWS, RollingWindows, rolling_frame
+from utils.similarity import SimilarityIndex, cohort_correlations, correlation_matrix
+from utils.trend_stats import TrendStats
+
+# Fixed parts of the insights report, formatted once per patient
+INSIGHTS_HEADER = """**Health Analytics Summary for {name}**
+
+**Current Health Status:**
+"""
+
+INSIGHTS_CURRENT_STATUS = """
+- **Heart Rate:** {heart_rate:.0f} bpm
+- **Blood Pressure:** {systolic:.0f}/{diastolic:.0f} mmHg
+- **Blood Glucose:** {blood_glucose:.0f} mg/dL
+- **Weight:** {weight:.1f} kg
+"""
+
+INSIGHTS_GUIDANCE = """
+**General Health Guidance:**
+- Continue regular monitoring of your health metrics
+- Maintain consistent measurement times for accuracy
+- Track any symptoms or changes in how you feel
+- Share this data with your healthcare provider during visits
+- Consider lifestyle factors that may influence your readings
+
+**When to Consult Your Healthcare Provider:**
+- Sudden significant changes in any health metrics
+- Persistent abnormal readings
+- New or worsening symptoms
+- Questions about your health trends
+- Before making major lifestyle or medication changes
+
+**Important Note:** These insights are based on data analysis and should not replace professional medical advice. Always consult with your healthcare provider for medical decisions and treatment plans.
+"""
+
+def has_dates(health_data):
+    """Check whether any reading in ``health_data`` has a date"""
+    return 'date' in health_data.columns and bool(health_data['date'].notna().any())
 
 class HealthAnalytics:
-    def __init__(self):
-        pass
+    def __init__(self, data_manager=None, cache_size=1024):
+        """Create the analytics engine, optionally bound to a PatientDataManager
+        
+        With a manager, trends for a patient's full history come from its
+        running statistics, and trends, risks, recommendations and insights
+        for frames returned by its get_health_data are memoized per (patient,
+        data version, window) in an LRU cache of ``cache_size`` entries. Cached results are shared, so callers must not
+        modify them.
+        """
+        self.data_manager = data_manager
+        self._cache = LRUCache(cache_size)
+    
+    def cache_stats(self):
+        """Return hit/miss counters and size of the analytics cache"""
+        return self._cache.stats()
     
     def calculate_health_trends(self, health_data):
         """Calculate trends in health metrics"""
         if health_data.empty:
             return {}
+        return self._memoized('trends', health_data, lambda: self._calculate_health_trends(health_data))
+    
+    def _calculate_health_trends(self, health_data):
+        patient_name = health_data.attrs.get('patient_name')
+        if self.data_manager is not None and patient_name is not None:
+            trends = self.data_manager.get_health_trends(patient_name, health_data)
+            if trends is not None:
+                return trends
+        
+        # Closed-form linear trend and summary statistics for each metric
+        return TrendStats.from_frame(health_data, HEALTH_METRICS).as_trends()
+    
+    def calculate_rolling_windows(self, health_data, windows=None):
+        """Calculate rolling means/stds and EWMA at every reading, e.g. for chart bands
+        
+        ``windows`` maps names to widths and defaults to 7, 30 and 90 days; see
+        rolling_windows.rolling_frame for the returned columns.
+        """
+        windows = ROLLING_WINDOWS if windows is None else windows
+        # Time-based windows need dates; records added without one have none
+        if not has_dates(health_data):
+            return pd.DataFrame()
+        return self._memoized(
+            ('rolling', tuple(windows.items())), health_data,
+            lambda: rolling_frame(health_data, HEALTH_METRICS, windows)
+        )
+    
+    def calculate_rolling_summary(self, health_data):
+        """Calculate each metric's 7/30/90 day means/stds and EWMA at the latest reading"""
+        if not has_dates(health_data):
+            return {}
+        patient_name = health_data.attrs.get('patient_name')
+        if self.data_manager is not None and patient_name is not None:
+            summary = self.data_manager.get_rolling_summary(patient_name, health_data)
+            if summary is not None:
+                return summary
+        return self._memoized(
+            'rolling_summary', health_data,
+            lambda: RollingWindows.from_frame(health_data, HEALTH_METRICS).summary()
+        )
+    
+    def calculate_cohort_trends(self, cohort_data, patient_column='patient_name'):
+        """Calculate trends for every patient in a long DataFrame at once
+        
+        ``cohort_data`` holds many patients' readings told apart by
+        ``patient_column``, as returned by PatientDataManager.generate_cohort.
+        Returns a tidy frame indexed by patient with one row per patient and
+        metric and the same slope/current/average/min/max/std values that
+        calculate_health_trends gives for that patient alone.
+        """
+        columns = ['metric', 'slope', 'current', 'average', 'min', 'max', 'std']
+        if cohort_data.empty:
+            return pd.DataFrame(columns=columns).rename_axis(patient_column)
+        
+        codes, patients = pd.factorize(cohort_data[patient_column])
+        # Order rows by patient, then date, so each patient is one contiguous segment
+        if 'date' in cohort_data.columns:
+            order = np.lexsort((cohort_data['date'].to_numpy(), codes))
+        else:
+            order = np.argsort(codes, kind='stable')
+        codes = codes[order]
+        starts = np.searchsorted(codes, np.arange(len(patients)))
+        rows = np.arange(len(codes))
+        positions = (rows - starts[codes]).astype(float)
         
-        trends = {}
-        
-        # Calculate trends for each metric
-        for metric in ['heart_rate', 'systolic', 'diastolic', 'blood_glucose', 'weight']:
-            if metric in health_data.columns:
-                values = health_data[metric].values
-                if len(values) > 1:
-                    # Simple linear trend calculation
-                    x = np.arange(len(values))
-                    coeffs = np.polyfit(x, values, 1)
-                    trends[metric] = {
-                        'slope': coeffs[0],
-                        'current': values[-1],
-                        'average': np.mean(values),
-                        'min': np.min(values),
-                        'max': np.max(values),
-                        'std': np.std(values)
-                    }
-        
-        return trends
+        results = []
+        for metric in HEALTH_METRICS:
+            if metric not in cohort_data.columns:
+                continue
+            values = cohort_data[metric].to_numpy(dtype=float)[order]
+            valid = ~np.isnan(values)
+            filled = np.where(valid, values, 0.0)
+            
+            # Closed-form least squares over (position, value) per patient
+            count = np.bincount(codes, weights=valid, minlength=len(patients))
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean_x = np.bincount(codes, weights=positions * valid, minlength=len(patients)) / count
+                mean_y = np.bincount(codes, weights=filled, minlength=len(patients)) / count
+                dx = np.where(valid, positions - mean_x[codes], 0.0)
+                dy = np.where(valid, filled - mean_y[codes], 0.0)
+                m2_x = np.bincount(codes, weights=dx * dx, minlength=len(patients))
+                m2_y = np.bincount(codes, weights=dy * dy, minlength=len(patients))
+                c_xy = np.bincount(codes, weights=dx * dy, minlength=len(patients))
+                slope = np.where(m2_x > 0, c_xy / np.where(m2_x > 0, m2_x, 1.0), 0.0)
+                std = np.sqrt(m2_y / count)
+            
+            last = np.maximum.reduceat(np.where(valid, rows, -1), starts)
+            keep = count > 1
+            results.append(pd.DataFrame({
+                patient_column: patients[keep],
+                'metric': metric,
+                'slope': slope[keep],
+                'current': values[last[keep]],
+                'average': mean_y[keep],
+                'min': np.fmin.reduceat(values, starts)[keep],
+                'max': np.fmax.reduceat(values, starts)[keep],
+                'std': std[keep]
+            }))
+        
+        if not results:
+            return pd.DataFrame(columns=columns).rename_axis(patient_column)
+        trends = pd.concat(results, ignore_index=True)
+        trends['metric'] = pd.Categorical(trends['metric'], categories=HEALTH_METRICS)
+        trends = trends.sort_values([patient_column, 'metric'], kind='stable')
+        return trends.set_index(patient_column)
+    
+    def calculate_metric_correlations(self, health_data):
+        """Calculate how each pair of metrics moves together (Pearson correlation matrix)"""
+        if health_data.empty:
+            return pd.DataFrame()
+        return self._memoized('correlations', health_data, lambda: correlation_matrix(health_data, HEALTH_METRICS))
+    
+    def calculate_cohort_correlations(self, cohort_data, patient_column='patient_name'):
+        """Calculate a correlation matrix for every patient in a long DataFrame at once
+        
+        Returns ``(patients, matrices)``; see similarity.cohort_correlations.
+        """
+        return cohort_correlations(cohort_data, HEALTH_METRICS, patient_column=patient_column)
+    
+    def build_similarity_index(self, cohort_data, patient_column='patient_name'):
+        """Build a SimilarityIndex over patients' trend profiles
+        
+        Each patient's feature vector holds the average, std, slope and current
+        value of every metric from calculate_cohort_trends; use
+        ``index.query(patient_name, k=20)`` to find the most similar patients.
+        """
+        trends = self.calculate_cohort_trends(cohort_data, patient_column=patient_column)
+        return SimilarityIndex.from_trends(trends, HEALTH_METRICS)
     
     def assess_health_risks(self, health_data, patient_info):
         """Assess health risks based on current metrics and trends"""
         if health_data.empty:
             return []
+        return self._memoized('risks', health_data, lambda: self._assess_health_risks(health_data))
+    
+    def _assess_health_risks(self, health_data):
+        # Latest-reading special case of the risk rule table
+        return latest_risks(health_data)
+    
+    def calculate_risk_episodes(self, health_data, patient_column=None):
+        """Find episodes where readings met a risk rule across the whole history
         
-        risks = []
-        latest_data = health_data.iloc[-1]
-        
-        # Blood pressure assessment
-        systolic = latest_data.get('systolic', 0)
-        diastolic = latest_data.get('diastolic', 0)
-        
-        if systolic >= 140 or diastolic >= 90:
-            risks.append({
-                'risk': 'Hypertension',
-                'level': 'High',
-                'description': 'Blood pressure readings consistently above normal range'
-            })
-        elif systolic >= 130 or diastolic >= 80:
-            risks.append({
-                'risk': 'Pre-hypertension',
-                'level': 'Moderate',
-                'description': 'Blood pressure elevated but not yet in hypertensive range'
-            })
-        
-        # Blood glucose assessment
-        glucose = latest_data.get('blood_glucose', 0)
-        if glucose >= 126:
-            risks.append({
-                'risk': 'Diabetes Risk',
-                'level': 'High',
-                'description': 'Fasting glucose levels indicate potential diabetes'
-            })
-        elif glucose >= 100:
-            risks.append({
-                'risk': 'Pre-diabetes',
-                'level': 'Moderate',
-                'description': 'Glucose levels elevated above normal range'
-            })
-        
-        # Heart rate assessment
-        heart_rate = latest_data.get('heart_rate', 0)
-        if heart_rate > 100:
-            risks.append({
-                'risk': 'Tachycardia',
-                'level': 'Moderate',
-                'description': 'Resting heart rate consistently elevated'
-            })
-        elif heart_rate < 60:
-            risks.append({
-                'risk': 'Bradycardia',
-                'level': 'Low',
-                'description': 'Resting heart rate below normal range'
-            })
-        
-        return risks
+        Every rule in risk_rules.RISK_RULES is evaluated as a mask over all
+        readings (of one patient, or of a cohort told apart by
+        ``patient_column``) and consecutive hits are merged into episodes with
+        a start, end and level.
+        """
+        # Episodes are spans of dates; with no dated readings there are none
+        if health_data.empty or 'date' not in health_data.columns:
+            return risk_episodes(health_data.iloc[0:0], patient_column=patient_column)
+        return self._memoized(
+            ('risk_episodes', patient_column), health_data,
+            lambda: risk_episodes(health_data, patient_column=patient_column)
+        )
     
     def generate_health_recommendations(self, health_data, patient_info):
         """Generate personalized health recommendations"""
         if health_data.empty:
             return []
-        
-        recommendations = []
         trends = self.calculate_health_trends(health_data)
-        risks = self.assess_health_risks(health_data, patient_info)
+        return self._memoized('recommendations', health_data, lambda: self._recommend_from_trends(trends))
+    
+    def _recommend_from_trends(self, trends):
+        recommendations = []
         
         # General recommendations
         recommendations.append({
@@ -147,81 +278,106 @@ class HealthAnalytics:
         """Generate comprehensive AI health insights"""
         if health_data.empty:
             return "No health data available for analysis. Please record some health metrics to receive personalized insights."
-        
+        # The rendered text includes the patient's name, so key on it too
+        return self._memoized(
+            ('insights', patient_info.get('name')), health_data,
+            lambda: self._generate_insights(health_data, patient_info)
+        )
+    
+    def _generate_insights(self, health_data, patient_info):
         trends = self.calculate_health_trends(health_data)
+        rolling = self.calculate_rolling_summary(health_data)
         risks = self.assess_health_risks(health_data, patient_info)
-        recommendations = self.generate_health_recommendations(health_data, patient_info)
+        # Reuse the trends above rather than recalculating them
+        recommendations = self._memoized('recommendations', health_data, lambda: self._recommend_from_trends(trends))
         
-        # Generate comprehensive insights
-        insights = f"""**Health Analytics Summary for {patient_info.get('name', 'Patient')}**
-
-**Current Health Status:**
-"""
+        # Build the report from parts joined once at the end
+        parts = [INSIGHTS_HEADER.format(name=patient_info.get('name', 'Patient'))]
         
         # Add current metrics summary
         latest_data = health_data.iloc[-1]
-        insights += f"""
-- **Heart Rate:** {latest_data.get('heart_rate', 'N/A'):.0f} bpm
-- **Blood Pressure:** {latest_data.get('systolic', 'N/A'):.0f}/{latest_data.get('diastolic', 'N/A'):.0f} mmHg
-- **Blood Glucose:** {latest_data.get('blood_glucose', 'N/A'):.0f} mg/dL
-- **Weight:** {latest_data.get('weight', 'N/A'):.1f} kg
-"""
+        parts.append(INSIGHTS_CURRENT_STATUS.format(
+            heart_rate=latest_data.get('heart_rate', 'N/A'),
+            systolic=latest_data.get('systolic', 'N/A'),
+            diastolic=latest_data.get('diastolic', 'N/A'),
+            blood_glucose=latest_data.get('blood_glucose', 'N/A'),
+            weight=latest_data.get('weight', 'N/A')
+        ))
         
-        # Add trend analysis
-        insights += "\n**Trend Analysis (Past 30 Days):**\n"
+        # Add trend analysis over the span the data actually covers, if dated
+        span = None
+        if has_dates(health_data):
+            # min/max skip readings added without a date
+            span = health_data['date'].max() - health_data['date'].min()
+            span_days = max(1, round(span / timedelta(days=1)))
+            parts.append(f"\n**Trend Analysis (Past {span_days} Days):**\n")
+        else:
+            parts.append("\n**Trend Analysis:**\n")
         
         for metric, trend_data in trends.items():
             trend_direction = "↗️" if trend_data['slope'] > 0.1 else "↘️" if trend_data['slope'] < -0.1 else "➡️"
             metric_name = metric.replace('_', ' ').title()
-            insights += f"- **{metric_name}:** {trend_direction} "
-            
             if abs(trend_data['slope']) > 0.1:
-                insights += f"{'Increasing' if trend_data['slope'] > 0 else 'Decreasing'} trend detected\n"
+                trend_text = f"{'Increasing' if trend_data['slope'] > 0 else 'Decreasing'} trend detected"
             else:
-                insights += "Stable trend\n"
+                trend_text = "Stable trend"
+            parts.append(f"- **{metric_name}:** {trend_direction} {trend_text}\n")
+        
+        # Add rolling averages for the windows the data spans
+        windows = [] if span is None else [
+            name for name, width in ROLLING_WINDOWS.items() if width <= span + timedelta(days=1)
+        ]
+        if rolling and windows:
+            parts.append("\n**Rolling Averages:**\n")
+            for metric, summary in rolling.items():
+                metric_name = metric.replace('_', ' ').title()
+                averages = ", ".join(f"{name}: {summary[f'mean_{name}']:.1f}" for name in windows)
+                parts.append(f"- **{metric_name}:** {averages} (EWMA: {summary['ewma']:.1f})\n")
         
         # Add risk assessment
+        parts.append("\n**Health Risk Assessment:**\n")
         if risks:
-            insights += "\n**Health Risk Assessment:**\n"
             for risk in risks:
                 risk_emoji = "🔴" if risk['level'] == 'High' else "🟡" if risk['level'] == 'Moderate' else "🟢"
-                insights += f"- {risk_emoji} **{risk['risk']}** ({risk['level']} Risk): {risk['description']}\n"
+                parts.append(f"- {risk_emoji} **{risk['risk']}** ({risk['level']} Risk): {risk['description']}\n")
         else:
-            insights += "\n**Health Risk Assessment:**\n✅ No significant health risks detected based on current metrics.\n"
+            parts.append("✅ No significant health risks detected based on current metrics.\n")
         
         # Add recommendations
         if recommendations:
-            insights += "\n**Personalized Recommendations:**\n"
+            parts.append("\n**Personalized Recommendations:**\n")
             high_priority = [r for r in recommendations if r['priority'] == 'High']
             medium_priority = [r for r in recommendations if r['priority'] == 'Medium']
             
             if high_priority:
-                insights += "\n**High Priority:**\n"
-                for rec in high_priority:
-                    insights += f"- 🔴 **{rec['category']}:** {rec['recommendation']}\n"
+                parts.append("\n**High Priority:**\n")
+                parts.extend(f"- 🔴 **{rec['category']}:** {rec['recommendation']}\n" for rec in high_priority)
             
             if medium_priority:
-                insights += "\n**Medium Priority:**\n"
-                for rec in medium_priority:
-                    insights += f"- 🟡 **{rec['category']}:** {rec['recommendation']}\n"
+                parts.append("\n**Medium Priority:**\n")
+                parts.extend(f"- 🟡 **{rec['category']}:** {rec['recommendation']}\n" for rec in medium_priority)
         
         # Add general guidance
-        insights += """
-**General Health Guidance:**
-- Continue regular monitoring of your health metrics
-- Maintain consistent measurement times for accuracy
-- Track any symptoms or changes in how you feel
-- Share this data with your healthcare provider during visits
-- Consider lifestyle factors that may influence your readings
-
-**When to Consult Your Healthcare Provider:**
-- Sudden significant changes in any health metrics
-- Persistent abnormal readings
-- New or worsening symptoms
-- Questions about your health trends
-- Before making major lifestyle or medication changes
-
-**Important Note:** These insights are based on data analysis and should not replace professional medical advice. Always consult with your healthcare provider for medical decisions and treatment plans.
-"""
+        parts.append(INSIGHTS_GUIDANCE)
         
-        return insights
+        return ''.join(parts)
+    
+    def _memoized(self, kind, health_data, compute):
+        """Return a cached result for this patient's data version, computing it on a miss"""
+        key = self._cache_key(kind, health_data)
+        if key is None:
+            return compute()
+        result = self._cache.get(key)
+        if result is None:
+            result = compute()
+            self._cache[key] = result
+        return result
+    
+    def _cache_key(self, kind, health_data):
+        """Key a frame by (patient, data version, window), or None if it cannot be cached"""
+        # Only frames returned by get_health_data are keyed; anything derived
+        # from one may hold different values under the same attrs
+        source = self.data_manager.frame_source(health_data) if self.data_manager is not None else None
+        if source is None:
+            return None
+        return (kind,) + source
@@ -0,0 +1,157 @@
+"""Batch export of health insight reports
+
+Pre-generates the Health Analytics insights for many patients, e.g. weekly
+summaries for a clinic:
+
+    python -m utils.insight_reports --db health.db --output-dir reports --format html
+
+Patients are split into shards for a process pool; each worker opens the
+store itself, renders its patients' reports and writes them straight to
+``<output-dir>/<patient>.md`` (or ``.html``).
+"""
+import os
+import re
+import html
+import time
+import argparse
+from string import Template
+from urllib.parse import quote
+from utils.batch import run_sharded
+from utils.patient_store import open_store
+
+REPORT_FORMATS = {'markdown': '.md', 'html': '.html'}
+
+# Templates and patterns are compiled once per process and reused for every report
+HTML_PAGE = Template("""<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>Health Insights - $title</title>
+<style>body{font-family:sans-serif;max-width:48em;margin:2em auto;line-height:1.5}</style>
+</head>
+<body>
+$body
+</body>
+</html>
+""")
+_BOLD = re.compile(r'\*\*(.+?)\*\*')
+_LIST_ITEM = re.compile(r'^- (.*)$')
+
+def markdown_to_html(text):
+    """Convert the Markdown subset used by generate_insights to HTML
+    
+    Handles ``**bold**`` text, ``- `` bullet lists and paragraphs, which is
+    all the insight reports use.
+    """
+    blocks = []
+    items = []
+    for line in html.escape(text, quote=False).splitlines():
+        line = _BOLD.sub(r'<strong>\1</strong>', line.strip())
+        item = _LIST_ITEM.match(line)
+        if item:
+            items.append(f'<li>{item.group(1)}</li>')
+            continue
+        if items:
+            blocks.append('<ul>\n' + '\n'.join(items) + '\n</ul>')
+            items = []
+        if line:
+            blocks.append(f'<p>{line}</p>')
+    if items:
+        blocks.append('<ul>\n' + '\n'.join(items) + '\n</ul>')
+    return '\n'.join(blocks)
+
+def render_report(analytics, profile, health_data, format='markdown'):
+    """Render one patient's insights report as Markdown or HTML"""
+    insights = analytics.generate_insights(health_data, profile)
+    if format == 'html':
+        return HTML_PAGE.substitute(title=html.escape(profile['name']), body=markdown_to_html(insights))
+    return insights
+
+def report_path(output_dir, name, format='markdown'):
+    """Return the file a patient's report is written to"""
+    return os.path.join(output_dir, quote(name, safe='') + REPORT_FORMATS[format])
+
+def _render_shard(store, analytics, names, output_dir, format):
+    written = 0
+    size = 0
+    for name in names:
+        profile = store.load_patient(name)
+        health_data = store.load_health_data(name)
+        if profile is None or health_data.empty:
+            continue
+        report = render_report(analytics, profile, health_data, format).encode('utf-8')
+        with open(report_path(output_dir, name, format), 'wb') as f:
+            f.write(report)
+        written += 1
+        size += len(report)
+    return written, size
+
+def export_reports(output_dir, patients=None, db_path=None, column_store_dir=None, format='markdown', workers=None,
+                   shard_size=100, progress=None):
+    """Write an insights report for each patient into ``output_dir``
+    
+    ``patients`` defaults to every stored patient; ``db_path`` and
+    ``column_store_dir`` select the store as in open_store. ``progress`` is
+    called with (reports written, total patients) as shards finish. Returns
+    a summary dict including reports per second.
+    """
+    if format not in REPORT_FORMATS:
+        raise ValueError(f"Unknown report format {format!r}; expected one of {sorted(REPORT_FORMATS)}")
+    if patients is None:
+        store = open_store(db_path=db_path, column_store_dir=column_store_dir)
+        if store is None:
+            raise ValueError("Report export needs a patient store: pass a database path or column store directory")
+        patients = store.list_patient_names()
+        store.close()
+    patients = list(patients)
+    os.makedirs(output_dir, exist_ok=True)
+    
+    written = 0
+    size = 0
+    start = time.perf_counter()
+    shards = run_sharded(_render_shard, patients, db_path, column_store_dir, workers, shard_size,
+                         args=(output_dir, format))
+    for shard_written, shard_bytes in shards:
+        written += shard_written
+        size += shard_bytes
+        if progress is not None:
+            progress(written, len(patients))
+    elapsed = time.perf_counter() - start
+    return {
+        'patients': len(patients),
+        'reports': written,
+        'skipped': len(patients) - written,
+        'bytes': size,
+        'seconds': elapsed,
+        'reports_per_sec': written / elapsed if elapsed > 0 else 0.0
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export health insight reports for many patients")
+    parser.add_argument('--db', dest='db_path', help="SQLite patient store (default: $HEALTHAI_DB_PATH)")
+    parser.add_argument('--column-store', dest='column_store_dir',
+                        help="Column store directory (default: $HEALTHAI_COLUMN_STORE_DIR)")
+    parser.add_argument('--output-dir', default='reports', help="Directory the reports are written to")
+    parser.add_argument('--format', choices=sorted(REPORT_FORMATS), default='markdown')
+    parser.add_argument('--patient', dest='patients', action='append',
+                        help="Patient to export (repeatable; default: every stored patient)")
+    parser.add_argument('--workers', type=int, help="Worker processes (default: number of CPUs)")
+    parser.add_argument('--shard-size', type=int, default=100, help="Patients per work item")
+    args = parser.parse_args(argv)
+    
+    summary = export_reports(
+        args.output_dir,
+        patients=args.patients,
+        db_path=args.db_path,
+        column_store_dir=args.column_store_dir,
+        format=args.format,
+        workers=args.workers,
+        shard_size=args.shard_size,
+        progress=lambda written, total: print(f"\rWrote {written}/{total} reports", end='', flush=True)
+    )
+    print(f"\nWrote {summary['reports']} reports ({summary['bytes'] / 1e6:.1f} MB) to {args.output_dir} "
+          f"in {summary['seconds']:.1f} s ({summary['reports_per_sec']:.0f} reports/sec, "
+          f"{summary['skipped']} without data)")
+
+if __name__ == '__main__':
+    main()
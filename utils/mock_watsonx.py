@@ -0,0 +1,177 @@
+"""Local stand-in for the watsonx.ai text generation and IAM token endpoints
+
+Lets AIIntegration make real HTTP calls, streaming included, offline for
+tests and benchmarks:
+
+    python -m utils.mock_watsonx --port 8765 --latency 0.2
+
+then point the client at it:
+
+    AIIntegration(api_key='test', base_url='http://127.0.0.1:8765',
+                  iam_url='http://127.0.0.1:8765/identity/token')
+
+Responses come from AIIntegration's simulated answers. The server speaks
+HTTP/1.1 so clients can keep connections alive, and counts connections and
+requests so connection reuse can be checked.
+"""
+import re
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; without this, Nagle's
+    # algorithm holds the body back on kept-alive connections
+    disable_nagle_algorithm = True
+    
+    def setup(self):
+        super().setup()
+        self.server.stats['connections'] += 1
+    
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        path = urlsplit(self.path).path
+        self.server.stats['requests'] += 1
+        
+        if path == '/identity/token':
+            self._send_json(200, {
+                'access_token': f"mock-token-{self.server.stats['tokens']}",
+                'token_type': 'Bearer',
+                'expires_in': self.server.token_ttl,
+                'expiration': int(time.time() + self.server.token_ttl)
+            })
+            self.server.stats['tokens'] += 1
+        elif path in ('/ml/v1/text/generation', '/ml/v1/text/generation_stream'):
+            if not self.headers.get('Authorization', '').startswith('Bearer '):
+                self._send_json(401, {'errors': [{'code': 'authentication_token_not_valid'}]})
+                return
+            request = json.loads(body)
+            if self.server.latency:
+                time.sleep(self.server.latency)
+            text = self.server.responder(request['input'])
+            if path.endswith('_stream'):
+                self._send_stream(request, text)
+                return
+            self._send_json(200, {
+                'model_id': request.get('model_id'),
+                'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                'results': [{
+                    'generated_text': text,
+                    'generated_token_count': len(text.split()),
+                    'input_token_count': len(request['input'].split()),
+                    'stop_reason': 'eos_token'
+                }]
+            })
+        else:
+            self._send_json(404, {'errors': [{'code': 'not_found'}]})
+    
+    def _send_json(self, status, payload):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+    
+    def _send_stream(self, request, text):
+        # Server-sent events over chunked transfer encoding, a few words per event
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        words = re.findall(r'\S+\s*|\s+', text)
+        for i in range(0, len(words), 4):
+            if self.server.chunk_delay:
+                time.sleep(self.server.chunk_delay)
+            data = json.dumps({
+                'model_id': request.get('model_id'),
+                'results': [{'generated_text': ''.join(words[i:i + 4]), 'generated_token_count': min(i + 4, len(words))}]
+            })
+            event = f"id: {i // 4 + 1}\nevent: message\ndata: {data}\n\n"
+            self._write_chunk(event.encode('utf-8'))
+        self._write_chunk(b'')
+    
+    def _write_chunk(self, data):
+        self.wfile.write(f'{len(data):x}\r\n'.encode('ascii') + data + b'\r\n')
+    
+    def log_message(self, format, *args):
+        pass
+
+class MockWatsonxServer:
+    """Threaded mock server; use as a context manager or call start()/stop()
+    
+    ``latency`` adds a fixed delay to each generation request to stand in
+    for model time, and ``chunk_delay`` a delay before each streamed chunk.
+    ``responder(prompt)`` returns the generated text and defaults to
+    AIIntegration's simulated responses.
+    """
+    
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, chunk_delay=0.0, token_ttl=3600, responder=None):
+        if responder is None:
+            from utils.ai_integration import AIIntegration
+            responder = AIIntegration()._simulate_ai_response
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.latency = latency
+        self._server.chunk_delay = chunk_delay
+        self._server.token_ttl = token_ttl
+        self._server.responder = responder
+        self._server.stats = {'connections': 0, 'requests': 0, 'tokens': 0}
+        self._thread = None
+    
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+    
+    @property
+    def iam_url(self):
+        return f"{self.url}/identity/token"
+    
+    @property
+    def stats(self):
+        return dict(self._server.stats)
+    
+    def serve_forever(self):
+        """Serve in the calling thread until interrupted"""
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+    
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+    
+    def __enter__(self):
+        return self.start()
+    
+    def __exit__(self, *exc):
+        self.stop()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a local mock of the watsonx.ai generation endpoint")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds added to each generation request")
+    parser.add_argument('--chunk-delay', type=float, default=0.0, help="Seconds between streamed chunks")
+    args = parser.parse_args(argv)
+    
+    server = MockWatsonxServer(args.host, args.port, latency=args.latency, chunk_delay=args.chunk_delay)
+    print(f"Mock watsonx listening on {server.url} (IAM token endpoint {server.iam_url})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
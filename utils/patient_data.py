@@ -1,108 +1,634 @@
+import os
+import time
+import itertools
+import threading
+import uuid
+import weakref
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-import random
+from utils.anomaly_detection import AnomalyDetector
+from utils.lru_cache import LRUCache
+from utils.patient_index import PatientIndex
+from utils.record_buffer import HealthRecordBuffer
+from utils.rolling_windows import RollingWindows
+from utils.rollups import PatientRollups, aggregate_frame
+from utils.trend_stats import TrendStats
+from utils.rwlock import ReadWriteLock
+
+HEALTH_METRICS = ['heart_rate', 'systolic', 'diastolic', 'blood_glucose', 'weight']
+
+# Realistic (min, max) bounds for each metric
+METRIC_RANGES = {
+    'heart_rate': (50, 120),
+    'systolic': (90, 180),
+    'diastolic': (60, 120),
+    'blood_glucose': (70, 200),
+    'weight': (40, 150),
+}
 
 class PatientDataManager:
-    def __init__(self):
+    def __init__(self, seed=None, store=None, cache_size=1024):
+        """Create a manager, optionally backed by a persistent PatientStore
+        
+        Without a store everything lives in memory as before. With a store,
+        profiles and health data are loaded on first access and only the
+        ``cache_size`` most recently used patients are kept in memory.
+        
+        The manager is safe to share between threads (e.g. Streamlit sessions):
+        reads run concurrently and writes are serialized by a readers-writer lock.
+        """
+        self.store = store
+        self._lock = ReadWriteLock()
+        self._rng_lock = threading.Lock()
         if not hasattr(self, 'patients'):
-            self.patients = {}
-            self.health_data = {}
+            if store is None:
+                self.patients = {}
+                self.health_data = {}
+            else:
+                self.patients = LRUCache(cache_size)
+                self.health_data = LRUCache(cache_size)
+        self.rng = np.random.default_rng(seed)
+        
+        # Secondary indexes for cohort lookups; for a store they are built on
+        # the first query rather than at startup
+        self.index = PatientIndex()
+        self._names_by_id = {}
+        self._index_built = store is None
+        self._patient_names = None
+        
+        # Hourly/daily/weekly rollups, built on first use and then kept up to
+        # date as records are ingested
+        self._rollups = {} if store is None else LRUCache(cache_size)
+        
+        # Running trend statistics, updated in O(1) per appended record
+        self._trend_stats = {} if store is None else LRUCache(cache_size)
+        
+        # 7/30/90 day rolling windows and EWMA, also updated per record
+        self._rolling = {} if store is None else LRUCache(cache_size)
+        
+        # Watches readings added through add_health_record for sudden changes
+        self.anomaly_detector = AnomalyDetector(HEALTH_METRICS, max_patients=cache_size if store is not None else 10000)
+        
+        # Per-patient data versions for caches keyed on (patient, version); one
+        # shared counter means a version is never reused, even after eviction
+        self._versions = {}
+        self._version_counter = itertools.count(1)
+        
+        # Frames returned by get_health_data, by the token stamped in their
+        # attrs. pandas copies attrs onto derived frames too, so the entry
+        # keeps a weak reference to tell the returned object from its copies
+        self._issued_frames = {}
+        self._frame_tokens = itertools.count(1)
     
     def create_patient(self, patient_data):
         """Create a new patient profile"""
         name = patient_data['name']
-        self.patients[name] = {
+        patient = {
             'name': name,
             'age': patient_data['age'],
             'gender': patient_data['gender'],
             'medical_history': patient_data.get('medical_history', ''),
             'created_date': datetime.now()
         }
+        with self._lock.writing():
+            # Re-creating a patient keeps their existing ID
+            existing = self._load_patient(name)
+            patient['patient_id'] = existing['patient_id'] if existing else uuid.uuid4().hex
+            
+            self.patients[name] = patient
+            if self.store is not None:
+                self.store.save_patient(patient)
+            self._index_patient(patient)
+            self._patient_names = None
+            
+            # Generate initial health data
+            self._generate_health_data(name)
         
-        # Generate initial health data
-        self.generate_health_data(name)
-        
-        return self.patients[name]
+        return patient
     
     def get_patient(self, name):
         """Get patient by name"""
-        return self.patients.get(name)
+        with self._lock.reading():
+            return self._load_patient(name)
     
     def get_patient_names(self):
-        """Get list of all patient names"""
-        return list(self.patients.keys())
+        """Get list of all patient names
+        
+        The list is cached until the next patient is created, so callers must
+        not modify it.
+        """
+        with self._lock.reading():
+            if self._patient_names is None:
+                if self.store is not None:
+                    self._patient_names = self.store.list_patient_names()
+                else:
+                    self._patient_names = list(self.patients.keys())
+            return self._patient_names
+    
+    def get_patient_by_id(self, patient_id):
+        """Get patient by their stable patient ID"""
+        self._ensure_index()
+        with self._lock.reading():
+            name = self._names_by_id.get(patient_id)
+            return self._load_patient(name) if name is not None else None
+    
+    def get_patient_name(self, patient_id):
+        """Get the name of a patient from their stable patient ID"""
+        self._ensure_index()
+        with self._lock.reading():
+            return self._names_by_id.get(patient_id)
+    
+    def find_patients(self, age_band=None, gender=None, history_terms=None):
+        """Return IDs of patients matching an age band, gender and history terms
+        
+        ``age_band`` uses the ten-year bands from ``patient_index.age_band``
+        (e.g. '40-49') and ``history_terms`` must all appear in the patient's
+        medical history. Lookups go through the secondary indexes, so no
+        profiles are scanned.
+        """
+        self._ensure_index()
+        with self._lock.reading():
+            return self.index.query(age_band=age_band, gender=gender, history_terms=history_terms)
     
     def update_patient(self, name, update_data):
         """Update patient information"""
-        if name in self.patients:
-            self.patients[name].update(update_data)
-            return self.patients[name]
-        return None
+        with self._lock.writing():
+            patient = self._load_patient(name)
+            if patient is not None:
+                patient.update(update_data)
+                if self.store is not None:
+                    self.store.save_patient(patient)
+                self._index_patient(patient)
+                self._bump_version(name)
+                return patient
+            return None
     
-    def generate_health_data(self, patient_name, days=30):
+    def generate_health_data(self, patient_name, days=30, seed=None):
         """Generate realistic health data for a patient over specified days"""
-        if patient_name not in self.patients:
+        with self._lock.writing():
+            return self._generate_health_data(patient_name, days=days, seed=seed)
+    
+    def _generate_health_data(self, patient_name, days=30, seed=None):
+        patient = self._load_patient(patient_name)
+        if patient is None:
             return pd.DataFrame()
         
-        patient = self.patients[patient_name]
-        
-        # Base values based on age and gender
-        base_heart_rate = 70 + random.randint(-10, 10)
-        base_systolic = 120 + (patient['age'] - 30) * 0.5 + random.randint(-10, 10)
-        base_diastolic = 80 + (patient['age'] - 30) * 0.3 + random.randint(-5, 5)
-        base_glucose = 90 + random.randint(-10, 15)
-        base_weight = 70 + random.randint(-15, 25)
+        df = self._generate_cohort([patient], days=days, seed=seed)
+        self._rollups.pop(patient_name, None)
+        self._trend_stats.pop(patient_name, None)
+        self._rolling.pop(patient_name, None)
+        self.anomaly_detector.reset(patient_name)
+        self._bump_version(patient_name)
+        if self.store is not None:
+            self.store.save_health_data(patient_name, df)
+            if self.store.memory_mapped:
+                return self.store.load_health_data(patient_name)
+        self.health_data[patient_name] = HealthRecordBuffer.from_frame(df, patient_name=patient_name)
+        return self.health_data[patient_name].to_frame()
+    
+    def generate_cohort(self, patients, days=30, seed=None, end_date=None):
+        """Generate health data for many patients at once as one long DataFrame
         
+        ``patients`` may hold patient names known to the manager or profile dicts
+        with at least ``name`` and ``age``. All metrics for all patients are drawn
+        as (patients x days) arrays in one pass; passing ``seed`` makes the output
+        reproducible, otherwise the manager's own generator is used. Patients
+        are told apart by a categorical ``patient_name`` column; metrics are
+        float32 like the stored frames.
+        """
+        with self._lock.reading():
+            profiles = [self._load_patient(p) if isinstance(p, str) else p for p in patients]
+        return self._generate_cohort(profiles, days=days, seed=seed, end_date=end_date)
+    
+    def _generate_cohort(self, profiles, days=30, seed=None, end_date=None):
+        if seed is None:
+            # The shared generator is not thread-safe
+            with self._rng_lock:
+                return self._draw_cohort(profiles, days, self.rng, end_date)
+        return self._draw_cohort(profiles, days, np.random.default_rng(seed), end_date)
+    
+    def _draw_cohort(self, profiles, days, rng, end_date):
         # Generate dates
-        end_date = datetime.now()
+        end_date = end_date or datetime.now()
         start_date = end_date - timedelta(days=days)
         dates = pd.date_range(start=start_date, end=end_date, freq='D')
         
-        # Generate data with some trends and variations
-        data = []
-        for i, date in enumerate(dates):
-            # Add some realistic variation and trends
-            heart_rate = base_heart_rate + np.sin(i * 0.1) * 5 + random.randint(-5, 5)
-            systolic = base_systolic + np.sin(i * 0.05) * 3 + random.randint(-8, 8)
-            diastolic = base_diastolic + np.sin(i * 0.05) * 2 + random.randint(-5, 5)
-            glucose = base_glucose + np.sin(i * 0.2) * 10 + random.randint(-10, 15)
-            weight = base_weight + (i * 0.01) + random.uniform(-0.2, 0.2)  # Slight weight trend
+        n_patients, n_days = len(profiles), len(dates)
+        shape = (n_patients, n_days)
+        i = np.arange(n_days)
+        ages = np.array([p['age'] for p in profiles], dtype=float).reshape(-1, 1)
+        
+        # Base values based on age and gender
+        base_heart_rate = 70 + rng.integers(-10, 11, (n_patients, 1))
+        base_systolic = 120 + (ages - 30) * 0.5 + rng.integers(-10, 11, (n_patients, 1))
+        base_diastolic = 80 + (ages - 30) * 0.3 + rng.integers(-5, 6, (n_patients, 1))
+        base_glucose = 90 + rng.integers(-10, 16, (n_patients, 1))
+        base_weight = 70 + rng.integers(-15, 26, (n_patients, 1))
+        
+        # Add some realistic variation and trends
+        metrics = {
+            'heart_rate': base_heart_rate + np.sin(i * 0.1) * 5 + rng.integers(-5, 6, shape),
+            'systolic': base_systolic + np.sin(i * 0.05) * 3 + rng.integers(-8, 9, shape),
+            'diastolic': base_diastolic + np.sin(i * 0.05) * 2 + rng.integers(-5, 6, shape),
+            'blood_glucose': base_glucose + np.sin(i * 0.2) * 10 + rng.integers(-10, 16, shape),
+            'weight': base_weight + (i * 0.01) + rng.uniform(-0.2, 0.2, shape),  # Slight weight trend
+        }
+        
+        # Ensure values are within realistic ranges
+        data = {'date': np.tile(dates.values, n_patients)}
+        for metric, values in metrics.items():
+            low, high = METRIC_RANGES[metric]
+            data[metric] = np.clip(values, low, high, out=values).ravel().astype(HealthRecordBuffer.metric_dtype)
+        data['patient_name'] = pd.Categorical.from_codes(
+            np.repeat(np.arange(n_patients), n_days),
+            categories=[p['name'] for p in profiles]
+        )
+        
+        return pd.DataFrame(data)
+    
+    def get_health_data(self, patient_name, start=None, end=None, metrics=None):
+        """Get health data for a specific patient
+        
+        ``start`` and ``end`` (inclusive) limit the date range and ``metrics``
+        limits the returned columns; the ``date`` column is always included.
+        Bounds are found by binary search on the sorted dates, so a narrow
+        window costs O(log n + k) rather than a scan of the full history.
+        
+        The returned frame is registered with frame_source so analytics can
+        reuse results for it; it must not be modified in place.
+        """
+        with self._lock.reading():
+            df = self._read_health_data(patient_name, start, end, metrics)
+            if df is not None:
+                return self._issue_frame(df, patient_name, start, end, metrics)
+        
+        with self._lock.writing():
+            df = self._read_health_data(patient_name, start, end, metrics)
+            if df is None:
+                self._generate_health_data(patient_name)
+                df = self._read_health_data(patient_name, start, end, metrics)
+            if df is not None:
+                return self._issue_frame(df, patient_name, start, end, metrics)
+        return pd.DataFrame()
+    
+    def frame_source(self, health_data):
+        """Return the get_health_data call that produced ``health_data``, or None
+        
+        Returns (patient_name, data version, start, end, metrics) if
+        ``health_data`` is the very object get_health_data returned. Frames
+        derived from it (copies, slices, ``assign``) give None even though
+        they carry the same attrs.
+        """
+        entry = self._issued_frames.get(health_data.attrs.get('frame_token'))
+        if entry is None or entry[0]() is not health_data:
+            return None
+        return entry[1]
+    
+    def _issue_frame(self, df, patient_name, start, end, metrics):
+        """Register a frame returned by get_health_data; call with the lock held"""
+        source = (
+            patient_name, self._versions.get(patient_name, 0),
+            None if start is None else pd.Timestamp(start),
+            None if end is None else pd.Timestamp(end),
+            None if metrics is None else tuple(metrics)
+        )
+        # Buffers hand out the same cached frame until their next write
+        entry = self._issued_frames.get(df.attrs.get('frame_token'))
+        if entry is not None and entry[0]() is df and entry[1] == source:
+            return df
+        token = next(self._frame_tokens)
+        ref = weakref.ref(df, lambda _, token=token: self._issued_frames.pop(token, None))
+        self._issued_frames[token] = (ref, source)
+        df.attrs['frame_token'] = token
+        return df
+    
+    def _is_current_history(self, patient_name, health_data):
+        """Check whether ``health_data`` is the patient's full, current history from get_health_data"""
+        return self.frame_source(health_data) == (patient_name, self._versions.get(patient_name, 0), None, None, None)
+    
+    def _read_full_history(self, patient_name):
+        """Return a patient's full history, generating it if missing; call with the write lock held"""
+        df = self._read_health_data(patient_name, None, None, None)
+        if df is None:
+            self._generate_health_data(patient_name)
+            df = self._read_health_data(patient_name, None, None, None)
+        return df if df is not None else pd.DataFrame()
+    
+    def _read_health_data(self, patient_name, start, end, metrics):
+        """Return the requested window, or None if the patient has no data yet"""
+        if self.store is not None and self.store.memory_mapped:
+            # Columns are memory-mapped views, so nothing is copied into RAM
+            df = self.store.load_health_data(patient_name, start=start, end=end, metrics=metrics)
+            return df if len(df.columns) else None
+        
+        buffer = self._load_health_buffer(patient_name)
+        if buffer is None:
+            return None
+        if start is None and end is None and metrics is None:
+            return buffer.to_frame()
+        return buffer.query(start=start, end=end, columns=metrics)
+    
+    def get_health_rollup(self, patient_name, start=None, end=None, resolution='1D'):
+        """Get pre-aggregated health data for long time windows
+        
+        Returns mean/min/max/count per metric from the coarsest rollup tier
+        (hourly, daily or weekly) whose buckets are no wider than
+        ``resolution``, so a year-long chart reads a few hundred points
+        instead of every raw reading. Resolutions finer than an hour are
+        aggregated from the raw window on the fly.
+        """
+        rollups = self._rollups.get(patient_name)
+        if rollups is None:
+            # Build the tiers once from the full history, read under the same
+            # lock so no record can be appended before the tiers are registered
+            with self._lock.writing():
+                rollups = self._rollups.get(patient_name)
+                if rollups is None:
+                    rollups = PatientRollups.from_frame(self._read_full_history(patient_name), HEALTH_METRICS)
+                    self._rollups[patient_name] = rollups
+        
+        with self._lock.reading():
+            result = rollups.query(start=start, end=end, resolution=resolution)
+        if result is not None:
+            return result
+        
+        window = self.get_health_data(patient_name, start=start, end=end)
+        return aggregate_frame(window, resolution, HEALTH_METRICS)
+    
+    def get_health_trends(self, patient_name, health_data=None):
+        """Get running trend statistics over a patient's full history
+        
+        Returns the same {metric: {'slope', 'current', 'average', 'min',
+        'max', 'std'}} dict as HealthAnalytics.calculate_health_trends. The
+        statistics are built once and then updated as records are appended.
+        If ``health_data`` is given and is not the frame get_health_data
+        returned for the current full history (e.g. a time window, a
+        modified copy or an older read), None is returned.
+        """
+        stats = self._trend_stats.get(patient_name)
+        if stats is None:
+            # Read the history under the lock so no record slips in unseen
+            with self._lock.writing():
+                stats = self._trend_stats.get(patient_name)
+                if stats is None:
+                    stats = TrendStats.from_frame(self._read_full_history(patient_name), HEALTH_METRICS)
+                    self._trend_stats[patient_name] = stats
+        
+        with self._lock.reading():
+            if health_data is not None and not self._is_current_history(patient_name, health_data):
+                return None
+            return stats.as_trends()
+    
+    def get_rolling_summary(self, patient_name, health_data=None):
+        """Get rolling-window means/stds and the EWMA of each metric at the latest reading
+        
+        Returns {metric: {'mean_7d', 'std_7d', 'count_7d', ..., 'ewma'}}. Like
+        get_health_trends, the state is built once and then updated per
+        record, and None is returned if ``health_data`` is given and is not
+        the current full history from get_health_data.
+        """
+        rolling = self._rolling.get(patient_name)
+        if rolling is None:
+            with self._lock.writing():
+                rolling = self._rolling.get(patient_name)
+                if rolling is None:
+                    rolling = RollingWindows.from_frame(self._read_full_history(patient_name), HEALTH_METRICS)
+                    self._rolling[patient_name] = rolling
+        
+        with self._lock.reading():
+            if health_data is not None and not self._is_current_history(patient_name, health_data):
+                return None
+            return rolling.summary()
+    
+    def get_data_version(self, patient_name):
+        """Return a number that changes whenever the patient's data or profile is written"""
+        return self._versions.get(patient_name, 0)
+    
+    def health_data_memory_usage(self):
+        """Return in-memory size of the loaded health data and bytes per reading"""
+        with self._lock.reading():
+            buffers = [self.health_data.get(name) for name in list(self.health_data.keys())]
+        buffers = [buffer for buffer in buffers if buffer is not None]
+        readings = sum(len(buffer) for buffer in buffers)
+        nbytes = sum(buffer.nbytes for buffer in buffers)
+        return {
+            'patients': len(buffers),
+            'readings': readings,
+            'bytes': nbytes,
+            'bytes_per_reading': nbytes / readings if readings else 0.0
+        }
+    
+    def add_health_record(self, patient_name, record_data):
+        """Add a new health record for a patient
+        
+        Records go into the patient's columnar buffer in amortized O(1); the
+        DataFrame is only rebuilt when get_health_data is next called. With a
+        memory-mapped store the record is appended to its on-disk columns
+        instead. Returns None; read the data back with get_health_data.
+        
+        Every record is also fed to ``anomaly_detector``, which calls the
+        callbacks registered with add_anomaly_callback on sudden changes.
+        """
+        with self._lock.writing():
+            self._add_health_record(patient_name, record_data)
+        # Outside the lock, so callbacks may read from the manager
+        self.anomaly_detector.observe(patient_name, record_data)
+    
+    def add_anomaly_callback(self, callback):
+        """Call ``callback(anomaly)`` when an added record looks anomalous
+        
+        See AnomalyDetector.observe for the fields of ``anomaly``.
+        """
+        self.anomaly_detector.add_callback(callback)
+    
+    def _add_health_record(self, patient_name, record_data):
+        # Store the record before touching any derived state, so a rejected
+        # write (e.g. an undated record for the column store) leaves no trace
+        self._store_health_records(patient_name, [record_data], lambda buffer: buffer.append(record_data))
+        
+        rollups = self._rollups.get(patient_name)
+        if rollups is not None:
+            rollups.add_record(record_data)
+        stats = self._trend_stats.get(patient_name)
+        if stats is not None and not stats.update(record_data):
+            # A late reading changes every position; rebuild on next use
+            self._trend_stats.pop(patient_name, None)
+        rolling = self._rolling.get(patient_name)
+        if rolling is not None and not rolling.update(record_data):
+            self._rolling.pop(patient_name, None)
+        self._bump_version(patient_name)
+    
+    def bulk_import(self, source, format='csv', chunk_size=50000, patient_column='patient_name'):
+        """Import health readings in bulk from a device export
+        
+        ``source`` is a path or file object in ``csv`` or ``jsonl`` format, or
+        an iterable of record dicts. Rows are read in chunks of ``chunk_size``
+        so memory stays bounded for very large exports. Each row needs a
+        patient and a ``date``; metrics outside METRIC_RANGES are rejected and
+        rows already stored for the same (patient, date) are skipped.
+        
+        Returns a summary with row counts and the import rate in rows/sec.
+        """
+        started = time.perf_counter()
+        summary = {'rows_read': 0, 'rows_imported': 0, 'rows_rejected': 0, 'duplicates': 0}
+        
+        for chunk in self._read_import_chunks(source, format, chunk_size, patient_column):
+            rows = len(chunk)
+            chunk = self._validate_import_chunk(chunk, patient_column)
+            summary['rows_read'] += rows
+            summary['rows_rejected'] += rows - len(chunk)
             
-            # Ensure values are within realistic ranges
-            heart_rate = max(50, min(120, heart_rate))
-            systolic = max(90, min(180, systolic))
-            diastolic = max(60, min(120, diastolic))
-            glucose = max(70, min(200, glucose))
-            weight = max(40, min(150, weight))
+            unique = chunk.drop_duplicates([patient_column, 'date'])
+            summary['duplicates'] += len(chunk) - len(unique)
             
-            data.append({
-                'date': date,
-                'heart_rate': heart_rate,
-                'systolic': systolic,
-                'diastolic': diastolic,
-                'blood_glucose': glucose,
-                'weight': weight,
-                'patient_name': patient_name
-            })
-        
-        df = pd.DataFrame(data)
-        self.health_data[patient_name] = df
-        return df
+            # Lock per chunk so readers are not blocked for the whole import
+            with self._lock.writing():
+                for patient_name, group in unique.groupby(patient_column, sort=False):
+                    group = group.sort_values('date', kind='stable')
+                    existing = self._existing_dates(patient_name)
+                    if len(existing):
+                        dates = group['date'].to_numpy(dtype='datetime64[ns]')
+                        idx = np.minimum(np.searchsorted(existing, dates), len(existing) - 1)
+                        seen = existing[idx] == dates
+                        summary['duplicates'] += int(seen.sum())
+                        group = group[~seen]
+                    if group.empty:
+                        continue
+                    
+                    self._append_health_frame(patient_name, group.drop(columns=patient_column).reset_index(drop=True))
+                    summary['rows_imported'] += len(group)
+        
+        summary['seconds'] = time.perf_counter() - started
+        summary['rows_per_sec'] = summary['rows_read'] / summary['seconds'] if summary['seconds'] > 0 else 0.0
+        return summary
     
-    def get_health_data(self, patient_name):
-        """Get health data for a specific patient"""
-        if patient_name in self.health_data:
-            return self.health_data[patient_name]
+    def _read_import_chunks(self, source, format, chunk_size, patient_column):
+        """Yield DataFrame chunks from an import source"""
+        if isinstance(source, (str, os.PathLike)) or hasattr(source, 'read'):
+            if format == 'csv':
+                # Read names as text so a patient called "123" is not stored as the int 123
+                reader = pd.read_csv(source, chunksize=chunk_size, dtype={patient_column: str})
+            elif format == 'jsonl':
+                reader = pd.read_json(source, lines=True, chunksize=chunk_size, dtype={patient_column: str})
+            else:
+                raise ValueError(f"Unsupported import format: {format}")
+            with reader:
+                yield from reader
         else:
-            return self.generate_health_data(patient_name)
+            records = iter(source)
+            while True:
+                batch = list(itertools.islice(records, chunk_size))
+                if not batch:
+                    return
+                yield pd.DataFrame(batch)
     
-    def add_health_record(self, patient_name, record_data):
-        """Add a new health record for a patient"""
-        if patient_name not in self.health_data:
-            self.health_data[patient_name] = pd.DataFrame()
+    def _validate_import_chunk(self, chunk, patient_column):
+        """Drop rows without a patient or date, or with out-of-range metrics"""
+        if patient_column not in chunk.columns or 'date' not in chunk.columns:
+            return chunk.iloc[0:0]
+        
+        chunk = chunk.copy()
+        # ISO8601 parses each value on its own instead of guessing one format from the first row
+        chunk['date'] = pd.to_datetime(chunk['date'], errors='coerce', format='ISO8601')
+        valid = chunk['date'].notna() & chunk[patient_column].notna()
+        chunk[patient_column] = chunk[patient_column].where(~valid, chunk[patient_column].astype(str))
+        
+        for metric, (low, high) in METRIC_RANGES.items():
+            if metric not in chunk.columns:
+                continue
+            values = pd.to_numeric(chunk[metric], errors='coerce')
+            unparsable = values.isna() & chunk[metric].notna()
+            valid &= ~unparsable & (values.isna() | values.between(low, high))
+            chunk[metric] = values
         
-        new_record = pd.DataFrame([record_data])
-        self.health_data[patient_name] = pd.concat([self.health_data[patient_name], new_record], ignore_index=True)
+        columns = [patient_column, 'date'] + [m for m in HEALTH_METRICS if m in chunk.columns]
+        return chunk.loc[valid, columns]
+    
+    def _existing_dates(self, patient_name):
+        """Return the sorted dates already stored for a patient"""
+        if self.store is not None and self.store.memory_mapped:
+            df = self.store.load_health_data(patient_name, metrics=[])
+            return df['date'].to_numpy() if 'date' in df.columns else np.empty(0, dtype='datetime64[ns]')
+        buffer = self._load_health_buffer(patient_name)
+        return buffer.dates() if buffer is not None else np.empty(0, dtype='datetime64[ns]')
+    
+    def _append_health_frame(self, patient_name, frame):
+        """Append a validated, date-sorted frame of readings for one patient"""
+        self._store_health_records(patient_name, frame.to_dict('records'), lambda buffer: buffer.extend(frame))
         
-        return self.health_data[patient_name]
+        rollups = self._rollups.get(patient_name)
+        if rollups is not None:
+            rollups.add_frame(frame)
+        stats = self._trend_stats.get(patient_name)
+        if stats is not None and not stats.update_frame(frame):
+            self._trend_stats.pop(patient_name, None)
+        # A bulk chunk is cheaper to fold in by rebuilding on next use
+        self._rolling.pop(patient_name, None)
+        self._bump_version(patient_name)
+    
+    def _store_health_records(self, patient_name, records, add_to_buffer):
+        """Write records to the store and the patient's buffer; raises before changing either if rejected"""
+        if self.store is not None and self.store.memory_mapped:
+            self.store.append_health_records(patient_name, records)
+            return
+        
+        # Load the buffer before the store write, or it would be read back
+        # from the store with the new records already in it
+        buffer = self._load_health_buffer(patient_name)
+        if self.store is not None:
+            self.store.append_health_records(patient_name, records)
+        if buffer is None:
+            buffer = HealthRecordBuffer(patient_name=patient_name)
+            self.health_data[patient_name] = buffer
+        add_to_buffer(buffer)
+    
+    def _bump_version(self, patient_name):
+        self._versions[patient_name] = next(self._version_counter)
+    
+    def _load_patient(self, name):
+        """Return a patient profile, loading it from the store on first access"""
+        patient = self.patients.get(name)
+        if patient is None and self.store is not None:
+            patient = self.store.load_patient(name)
+            if patient is not None:
+                self._assign_patient_id(patient)
+                self.patients[name] = patient
+        return patient
+    
+    def _assign_patient_id(self, patient):
+        # Profiles stored before IDs existed get one on first load
+        if 'patient_id' not in patient:
+            patient['patient_id'] = uuid.uuid4().hex
+            self.store.save_patient(patient)
+    
+    def _index_patient(self, patient):
+        if self._index_built:
+            self.index.add(patient)
+            self._names_by_id[patient['patient_id']] = patient['name']
+    
+    def _ensure_index(self):
+        """Build the secondary indexes from the store on first use"""
+        if self._index_built:
+            return
+        with self._lock.writing():
+            if self._index_built:
+                return
+            for name in self.store.list_patient_names():
+                patient = self.patients.get(name) or self.store.load_patient(name)
+                if patient is None:
+                    continue
+                self._assign_patient_id(patient)
+                self.index.add(patient)
+                self._names_by_id[patient['patient_id']] = name
+            self._index_built = True
+    
+    def _load_health_buffer(self, patient_name):
+        """Return a patient's record buffer, loading it from the store on first access"""
+        buffer = self.health_data.get(patient_name)
+        if buffer is None and self.store is not None:
+            frame = self.store.load_health_data(patient_name)
+            if not frame.empty:
+                buffer = HealthRecordBuffer.from_frame(frame, patient_name=patient_name)
+                self.health_data[patient_name] = buffer
+        return buffer
\ No newline at end of file
@@ -0,0 +1,169 @@
+import os
+import json
+import math
+import sqlite3
+import threading
+import pandas as pd
+from datetime import datetime
+from utils.patient_data import HEALTH_METRICS
+
+def open_store(db_path=None, column_store_dir=None):
+    """Open the configured patient store, or return None for in-memory data
+    
+    A column store directory takes precedence over a SQLite database path;
+    both default to the HEALTHAI_COLUMN_STORE_DIR and HEALTHAI_DB_PATH
+    environment variables.
+    """
+    column_store_dir = column_store_dir or os.getenv('HEALTHAI_COLUMN_STORE_DIR')
+    db_path = db_path or os.getenv('HEALTHAI_DB_PATH')
+    if column_store_dir:
+        # Imported here because the column store builds on this module
+        from utils.column_store import MemmapPatientStore
+        return MemmapPatientStore(column_store_dir)
+    if db_path:
+        return SQLitePatientStore(db_path)
+    return None
+
+class PatientStore:
+    """Storage backend interface used by PatientDataManager
+    
+    Implementations persist patient profiles and their health time series. The
+    manager only calls these methods on first access to a patient or on writes,
+    so opening a store must not scan the stored patients.
+    """
+    
+    # Stores that serve reads straight from disk set this so the manager does
+    # not copy their time series into in-memory buffers
+    memory_mapped = False
+    
+    def list_patient_names(self):
+        """Return the names of all stored patients"""
+        raise NotImplementedError
+    
+    def load_patient(self, name):
+        """Return a stored patient profile, or None"""
+        raise NotImplementedError
+    
+    def save_patient(self, profile):
+        """Insert or replace a patient profile"""
+        raise NotImplementedError
+    
+    def load_health_data(self, name):
+        """Return a patient's full health data as a DataFrame (empty if none)"""
+        raise NotImplementedError
+    
+    def save_health_data(self, name, frame):
+        """Replace a patient's health data with the rows of ``frame``"""
+        raise NotImplementedError
+    
+    def append_health_records(self, name, records):
+        """Append health records (dicts of column -> value) for a patient"""
+        raise NotImplementedError
+    
+    def close(self):
+        pass
+    
+    @staticmethod
+    def _profile_from_json(payload):
+        """Decode a profile stored as JSON, restoring ``created_date`` as a datetime"""
+        profile = json.loads(payload)
+        if profile.get('created_date'):
+            profile['created_date'] = datetime.fromisoformat(profile['created_date'])
+        return profile
+    
+    @staticmethod
+    def _json_default(value):
+        if isinstance(value, datetime):
+            return value.isoformat()
+        return str(value)
+
+class SQLitePatientStore(PatientStore):
+    """Patient store kept in a single SQLite database file
+    
+    Profiles are stored as JSON; health readings go to a table keyed by
+    (patient_name, date) with one REAL column per metric.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        metric_columns = ', '.join(f'{metric} REAL' for metric in HEALTH_METRICS)
+        with self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS patients (name TEXT PRIMARY KEY, profile TEXT NOT NULL)'
+            )
+            self._conn.execute(
+                f'CREATE TABLE IF NOT EXISTS health_records (patient_name TEXT NOT NULL, date INTEGER, {metric_columns})'
+            )
+            self._conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_health_records_patient ON health_records (patient_name, date)'
+            )
+    
+    def list_patient_names(self):
+        with self._lock:
+            rows = self._conn.execute('SELECT name FROM patients ORDER BY rowid').fetchall()
+        return [row[0] for row in rows]
+    
+    def load_patient(self, name):
+        with self._lock:
+            row = self._conn.execute('SELECT profile FROM patients WHERE name = ?', (name,)).fetchone()
+        if row is None:
+            return None
+        return self._profile_from_json(row[0])
+    
+    def save_patient(self, profile):
+        payload = json.dumps(profile, default=self._json_default)
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT INTO patients (name, profile) VALUES (?, ?) '
+                'ON CONFLICT (name) DO UPDATE SET profile = excluded.profile',
+                (profile['name'], payload)
+            )
+    
+    def load_health_data(self, name):
+        columns = ', '.join(['date'] + HEALTH_METRICS)
+        with self._lock:
+            frame = pd.read_sql_query(
+                f'SELECT {columns} FROM health_records WHERE patient_name = ? ORDER BY date, rowid',
+                self._conn,
+                params=(name,)
+            )
+        if frame.empty:
+            return pd.DataFrame()
+        frame['date'] = pd.to_datetime(frame['date'], unit='ns')
+        frame.attrs['patient_name'] = name
+        return frame
+    
+    def save_health_data(self, name, frame):
+        rows = self._rows(name, frame.to_dict('records'))
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM health_records WHERE patient_name = ?', (name,))
+            self._conn.executemany(self._insert_sql(), rows)
+    
+    def append_health_records(self, name, records):
+        rows = self._rows(name, records)
+        with self._lock, self._conn:
+            self._conn.executemany(self._insert_sql(), rows)
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
+    
+    @staticmethod
+    def _insert_sql():
+        placeholders = ', '.join('?' * (len(HEALTH_METRICS) + 2))
+        columns = ', '.join(['patient_name', 'date'] + HEALTH_METRICS)
+        return f'INSERT INTO health_records ({columns}) VALUES ({placeholders})'
+    
+    @staticmethod
+    def _rows(name, records):
+        rows = []
+        for record in records:
+            date = record.get('date')
+            row = [name, None if date is None else pd.Timestamp(date).value]
+            for metric in HEALTH_METRICS:
+                value = record.get(metric)
+                row.append(None if value is None or math.isnan(value) else float(value))
+            rows.append(row)
+        return rows
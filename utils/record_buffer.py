@@ -0,0 +1,212 @@
+import functools
+import threading
+import pandas as pd
+import numpy as np
+from datetime import datetime
+
+def _locked(method):
+    """Run a buffer method while holding the buffer's lock"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+class HealthRecordBuffer:
+    """Columnar append buffer holding one patient's health records
+    
+    Each column lives in a NumPy array whose capacity doubles when full, so
+    appending a record is amortized O(1). The DataFrame view is only built when
+    someone reads it and is cached until the next write. Rows are kept ordered
+    by ``date`` so time-range queries can binary search it; out-of-order
+    appends are only sorted once, on the next read.
+    
+    Storage is compact: metrics are float32 and dates datetime64[ns], and the
+    patient is kept as frame metadata (``frame.attrs['patient_name']``)
+    rather than repeated in a per-row column.
+    """
+    
+    metric_dtype = np.dtype('float32')
+    
+    # Columns describing the whole buffer rather than a reading
+    metadata_columns = {'patient_name'}
+    
+    def __init__(self, capacity=64, patient_name=None):
+        self.patient_name = patient_name
+        self._columns = {}
+        self._size = 0
+        self._capacity = capacity
+        self._frame = None
+        self._sorted = True
+        self._lock = threading.RLock()
+        self.version = 0
+    
+    @classmethod
+    def from_frame(cls, frame, patient_name=None):
+        """Create a buffer pre-filled with the rows of a DataFrame"""
+        # Sized exactly; the first append doubles it
+        buffer = cls(capacity=max(1, len(frame)), patient_name=patient_name)
+        buffer.extend(frame)
+        return buffer
+    
+    def __len__(self):
+        return self._size
+    
+    @property
+    def nbytes(self):
+        """Bytes held by the column arrays, including spare capacity"""
+        return sum(column.nbytes for column in self._columns.values())
+    
+    @_locked
+    def append(self, record):
+        """Append a single record (dict of column -> value)"""
+        if self._size == self._capacity:
+            self._grow(self._size + 1)
+        
+        for name, value in record.items():
+            if name in self.metadata_columns:
+                continue
+            column = self._columns.get(name)
+            if column is None:
+                column = self._add_column(name, self._dtype_for_value(value))
+            column[self._size] = value
+        
+        self._check_order(self._size, self._size + 1)
+        self._size += 1
+        self._touch()
+    
+    @_locked
+    def extend(self, frame):
+        """Append all rows of a DataFrame in one vectorized copy"""
+        count = len(frame)
+        if count == 0:
+            return
+        if self._size + count > self._capacity:
+            self._grow(self._size + count)
+        
+        for name in frame.columns:
+            if name in self.metadata_columns:
+                continue
+            values = frame[name].to_numpy()
+            column = self._columns.get(name)
+            if column is None:
+                column = self._add_column(name, self._dtype_for_array(values))
+            column[self._size:self._size + count] = values
+        
+        self._check_order(self._size, self._size + count)
+        self._size += count
+        self._touch()
+    
+    @_locked
+    def to_frame(self):
+        """Return the buffered records as a DataFrame, cached until the next write"""
+        if self._frame is None:
+            self._ensure_sorted()
+            if not self._columns:
+                self._frame = pd.DataFrame()
+            else:
+                self._frame = pd.DataFrame(
+                    {name: column[:self._size] for name, column in self._columns.items()}
+                )
+            self._frame.attrs['patient_name'] = self.patient_name
+        return self._frame
+    
+    @_locked
+    def dates(self):
+        """Return the sorted date column (empty if records carry no dates)"""
+        if 'date' not in self._columns:
+            return np.empty(0, dtype='datetime64[ns]')
+        self._ensure_sorted()
+        return self._columns['date'][:self._size]
+    
+    @_locked
+    def query(self, start=None, end=None, columns=None):
+        """Return rows with ``start <= date <= end`` restricted to ``columns``
+        
+        The bounds are located with a binary search over the sorted date
+        column, so the cost is O(log n + k) for k returned rows. ``date`` is
+        always included; unknown column names are ignored.
+        """
+        if 'date' not in self._columns:
+            return self.to_frame() if columns is None else self.to_frame().reindex(columns=[])
+        
+        self._ensure_sorted()
+        dates = self._columns['date'][:self._size]
+        lo = 0 if start is None else int(np.searchsorted(dates, self._as_datetime64(start), side='left'))
+        hi = self._size if end is None else int(np.searchsorted(dates, self._as_datetime64(end), side='right'))
+        
+        if columns is None:
+            names = list(self._columns)
+        else:
+            names = ['date'] + [name for name in columns if name in self._columns and name != 'date']
+        frame = pd.DataFrame({name: self._columns[name][lo:hi] for name in names})
+        frame.attrs['patient_name'] = self.patient_name
+        return frame
+    
+    def _check_order(self, begin, stop):
+        # Flag the buffer for sorting if the new rows break the date order
+        if not self._sorted or 'date' not in self._columns:
+            return
+        dates = self._columns['date'][max(begin - 1, 0):stop]
+        if len(dates) > 1 and (np.diff(dates) < np.timedelta64(0)).any():
+            self._sorted = False
+    
+    def _ensure_sorted(self):
+        if self._sorted:
+            return
+        order = np.argsort(self._columns['date'][:self._size], kind='stable')
+        for column in self._columns.values():
+            column[:self._size] = column[:self._size][order]
+        self._sorted = True
+        self._touch()
+    
+    @staticmethod
+    def _as_datetime64(value):
+        return np.datetime64(pd.Timestamp(value).as_unit('ns'))
+    
+    def _touch(self):
+        self._frame = None
+        self.version += 1
+    
+    def _grow(self, required):
+        capacity = max(1, self._capacity)
+        while capacity < required:
+            capacity *= 2
+        
+        for name, column in self._columns.items():
+            grown = self._allocate(column.dtype, capacity)
+            grown[:self._size] = column[:self._size]
+            self._columns[name] = grown
+        self._capacity = capacity
+    
+    def _add_column(self, name, dtype):
+        # The date column is the sort key, so always store it as datetime64
+        if name == 'date':
+            dtype = np.dtype('datetime64[ns]')
+        # Rows written before this column existed keep the missing-value fill
+        self._columns[name] = self._allocate(dtype, self._capacity)
+        return self._columns[name]
+    
+    @staticmethod
+    def _allocate(dtype, capacity):
+        if dtype.kind == 'M':
+            return np.full(capacity, np.datetime64('NaT'), dtype=dtype)
+        if dtype.kind == 'f':
+            return np.full(capacity, np.nan, dtype=dtype)
+        return np.full(capacity, None, dtype=object)
+    
+    @staticmethod
+    def _dtype_for_value(value):
+        if isinstance(value, (datetime, np.datetime64)):
+            return np.dtype('datetime64[ns]')
+        if isinstance(value, (int, float, np.number)) and not isinstance(value, bool):
+            return HealthRecordBuffer.metric_dtype
+        return np.dtype(object)
+    
+    @staticmethod
+    def _dtype_for_array(values):
+        if values.dtype.kind == 'M':
+            return np.dtype('datetime64[ns]')
+        if values.dtype.kind in 'iuf':
+            return HealthRecordBuffer.metric_dtype
+        return np.dtype(object)
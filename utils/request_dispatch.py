@@ -0,0 +1,175 @@
+import time
+import random
+import threading
+from collections import deque
+import numpy as np
+import requests
+
+# HTTP statuses worth retrying: rate limited or a transient server error
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+def is_retryable(error):
+    """Return True for connection problems, timeouts and retryable HTTP statuses"""
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code in RETRY_STATUSES
+    return False
+
+def estimate_tokens(prompt, max_tokens):
+    """Rough token cost of a request: about four characters per prompt token plus the output budget"""
+    return len(prompt) // 4 + max_tokens
+
+class TokenBucket:
+    """Token bucket refilled at ``rate_per_minute`` and holding up to ``capacity``
+    
+    ``acquire`` reserves its tokens straight away and sleeps off any debt,
+    so callers are served in arrival order without a wakeup queue.
+    """
+    
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def reserve(self, amount=1):
+        """Take ``amount`` tokens and return how long the caller must wait for them"""
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            return max(0.0, -self._tokens / self.rate)
+    
+    def acquire(self, amount=1):
+        """Block until ``amount`` tokens are available and return the time waited"""
+        wait = self.reserve(amount)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+class _Flight:
+    __slots__ = ('done', 'result', 'error')
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class RequestDispatcher:
+    """Coalescing, rate limiting and retries in front of model calls
+    
+    Concurrent calls with the same key share one request: the first caller
+    makes it and the rest wait for its result (single flight). Each request
+    first takes one token from the requests-per-minute bucket and its
+    estimated token cost from the tokens-per-minute bucket. Failed requests
+    that ``retryable`` accepts are retried up to ``max_retries`` times with
+    full-jitter exponential backoff, honouring a Retry-After header.
+    """
+    
+    def __init__(self, requests_per_minute=120, tokens_per_minute=100000, max_retries=3, backoff=0.5,
+                 max_backoff=10.0, retryable=is_retryable):
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retryable = retryable
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._in_flight = 0
+        self._counts = {'requests': 0, 'coalesced': 0, 'retries': 0, 'failures': 0}
+        self._waits = deque(maxlen=1000)
+    
+    def call(self, key, func, *args, tokens=1):
+        """Return ``func(*args)``, sharing the result with concurrent calls for ``key``"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+                leader = True
+            else:
+                self._counts['coalesced'] += 1
+                leader = False
+        
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        
+        try:
+            flight.result = self._call_with_retries(func, args, tokens)
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+    
+    def throttle(self, tokens=1):
+        """Wait for rate limit capacity for one request; for calls that cannot be coalesced, like streams"""
+        wait = 0.0
+        with self._lock:
+            self._waiting += 1
+        try:
+            wait = max(self.request_bucket.reserve(1), self.token_bucket.reserve(tokens))
+            if wait > 0:
+                time.sleep(wait)
+        finally:
+            with self._lock:
+                self._waiting -= 1
+                self._counts['requests'] += 1
+                self._waits.append(wait)
+        return wait
+    
+    def stats(self):
+        """Return queue depth, in-flight requests, counters and recent rate limit wait times (seconds)"""
+        with self._lock:
+            stats = dict(self._counts)
+            stats.update({'queue_depth': self._waiting, 'in_flight': self._in_flight})
+            waits = np.array(self._waits)
+        stats.update({
+            'wait_mean': float(waits.mean()) if len(waits) else 0.0,
+            'wait_p95': float(np.percentile(waits, 95)) if len(waits) else 0.0,
+            'wait_max': float(waits.max()) if len(waits) else 0.0
+        })
+        return stats
+    
+    def _call_with_retries(self, func, args, tokens):
+        for attempt in range(self.max_retries + 1):
+            self.throttle(tokens)
+            with self._lock:
+                self._in_flight += 1
+            try:
+                return func(*args)
+            except Exception as e:
+                if attempt == self.max_retries or not self.retryable(e):
+                    with self._lock:
+                        self._counts['failures'] += 1
+                    raise
+                delay = self._retry_delay(attempt, e)
+                with self._lock:
+                    self._counts['retries'] += 1
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+            time.sleep(delay)
+    
+    def _retry_delay(self, attempt, error):
+        # Full jitter spreads retries from many callers apart
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        response = getattr(error, 'response', None)
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after:
+            try:
+                delay = max(delay, min(self.max_backoff, float(retry_after)))
+            except ValueError:
+                pass
+        return delay
@@ -0,0 +1,133 @@
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from utils.lru_cache import LRUCache
+
+def normalize_prompt(prompt):
+    """Collapse runs of whitespace so formatting-only differences share a cache entry"""
+    return ' '.join(prompt.split())
+
+def cache_key(prompt, model_id, max_tokens):
+    """Return the cache key for a generation request"""
+    payload = json.dumps([normalize_prompt(prompt), model_id, max_tokens])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class ResponseCache:
+    """Two-tier cache of model responses keyed by cache_key
+    
+    Lookups go to an in-memory LRU first and then to an optional SQLite file,
+    so responses survive restarts and are shared by processes using the same
+    file. Entries older than ``ttl`` seconds are treated as missing. The
+    memory tier holds at most ``maxsize`` entries; when the disk tier grows
+    past ``max_disk_entries`` the least recently used tenth is deleted.
+    """
+    
+    def __init__(self, path=None, maxsize=256, ttl=7 * 24 * 3600, max_disk_entries=10000):
+        self.path = path
+        self.ttl = ttl
+        self.max_disk_entries = max_disk_entries
+        self._memory = LRUCache(maxsize)
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'expired': 0, 'disk_evictions': 0}
+        self._lock = threading.Lock()
+        self._conn = None
+        self._disk_size = 0
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            with self._conn:
+                self._conn.execute(
+                    'CREATE TABLE IF NOT EXISTS responses '
+                    '(key TEXT PRIMARY KEY, response TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)'
+                )
+                self._conn.execute('CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed)')
+            self._disk_size = self._conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+    
+    def get(self, key):
+        """Return the cached response for ``key``, or None"""
+        now = time.time()
+        entry = self._memory.get(key)
+        if entry is not None:
+            created, response = entry
+            if now - created < self.ttl:
+                self._count('memory_hits')
+                return response
+            self._memory.pop(key)
+        
+        if self._conn is not None:
+            with self._lock:
+                row = self._conn.execute('SELECT response, created FROM responses WHERE key = ?', (key,)).fetchone()
+                if row is not None and now - row[1] < self.ttl:
+                    with self._conn:
+                        self._conn.execute('UPDATE responses SET accessed = ? WHERE key = ?', (now, key))
+                    self._stats['disk_hits'] += 1
+                    self._memory[key] = (row[1], row[0])
+                    return row[0]
+                if row is not None:
+                    with self._conn:
+                        self._conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+                    self._disk_size -= 1
+                    entry = row
+        
+        self._count('expired' if entry is not None else 'misses')
+        return None
+    
+    def set(self, key, response):
+        """Store a response in both tiers"""
+        now = time.time()
+        self._memory[key] = (now, response)
+        if self._conn is None:
+            return
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                'INSERT OR IGNORE INTO responses (key, response, created, accessed) VALUES (?, ?, ?, ?)',
+                (key, response, now, now)
+            )
+            if cursor.rowcount:
+                self._disk_size += 1
+            else:
+                self._conn.execute(
+                    'UPDATE responses SET response = ?, created = ?, accessed = ? WHERE key = ?',
+                    (response, now, now, key)
+                )
+            if self._disk_size > self.max_disk_entries:
+                self._evict_disk()
+    
+    def clear(self):
+        self._memory.clear()
+        if self._conn is not None:
+            with self._lock, self._conn:
+                self._conn.execute('DELETE FROM responses')
+                self._disk_size = 0
+    
+    def stats(self):
+        """Return hit/miss counters and the size of each tier"""
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses'] + stats['expired']
+        stats.update({
+            'hit_rate': (stats['memory_hits'] + stats['disk_hits']) / lookups if lookups else 0.0,
+            'memory_size': len(self._memory),
+            'disk_size': self._disk_size
+        })
+        return stats
+    
+    def close(self):
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
+            self._conn = None
+    
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+    
+    def _evict_disk(self):
+        # Delete in batches so eviction is not paid on every insert
+        target = int(self.max_disk_entries * 0.9)
+        self._conn.execute(
+            'DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed LIMIT ?)',
+            (self._disk_size - target,)
+        )
+        self._stats['disk_evictions'] += self._disk_size - target
+        self._disk_size = target
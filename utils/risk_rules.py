@@ -0,0 +1,147 @@
+import numpy as np
+import pandas as pd
+
+# Comparison operators usable in rule conditions
+RULE_OPERATORS = {
+    '>=': np.greater_equal,
+    '>': np.greater,
+    '<=': np.less_equal,
+    '<': np.less,
+}
+
+# Declarative risk thresholds. A rule fires when any of its (metric, op,
+# threshold) conditions holds; within a group only the first firing rule
+# counts, so list the more severe level first.
+RISK_RULES = [
+    {
+        'group': 'blood_pressure',
+        'risk': 'Hypertension',
+        'level': 'High',
+        'description': 'Blood pressure readings consistently above normal range',
+        'conditions': [('systolic', '>=', 140), ('diastolic', '>=', 90)],
+    },
+    {
+        'group': 'blood_pressure',
+        'risk': 'Pre-hypertension',
+        'level': 'Moderate',
+        'description': 'Blood pressure elevated but not yet in hypertensive range',
+        'conditions': [('systolic', '>=', 130), ('diastolic', '>=', 80)],
+    },
+    {
+        'group': 'blood_glucose',
+        'risk': 'Diabetes Risk',
+        'level': 'High',
+        'description': 'Fasting glucose levels indicate potential diabetes',
+        'conditions': [('blood_glucose', '>=', 126)],
+    },
+    {
+        'group': 'blood_glucose',
+        'risk': 'Pre-diabetes',
+        'level': 'Moderate',
+        'description': 'Glucose levels elevated above normal range',
+        'conditions': [('blood_glucose', '>=', 100)],
+    },
+    {
+        'group': 'heart_rate',
+        'risk': 'Tachycardia',
+        'level': 'Moderate',
+        'description': 'Resting heart rate consistently elevated',
+        'conditions': [('heart_rate', '>', 100)],
+    },
+    {
+        'group': 'heart_rate',
+        'risk': 'Bradycardia',
+        'level': 'Low',
+        'description': 'Resting heart rate below normal range',
+        'conditions': [('heart_rate', '<', 60)],
+    },
+]
+
+def evaluate_rules(frame, rules=None):
+    """Evaluate every rule against every reading at once
+    
+    Returns a boolean array of shape (readings, rules). Missing metrics and
+    NaN readings never satisfy a condition.
+    """
+    rules = RISK_RULES if rules is None else rules
+    columns = {}
+    masks = np.zeros((len(frame), len(rules)), dtype=bool)
+    claimed = {}
+    for j, rule in enumerate(rules):
+        mask = np.zeros(len(frame), dtype=bool)
+        for metric, op, threshold in rule['conditions']:
+            if metric not in frame.columns:
+                continue
+            if metric not in columns:
+                columns[metric] = frame[metric].to_numpy(dtype=float)
+            mask |= RULE_OPERATORS[op](columns[metric], threshold)
+        
+        # Earlier (more severe) rules in the same group take precedence
+        group = rule.get('group')
+        if group is not None:
+            taken = claimed.get(group)
+            if taken is not None:
+                mask &= ~taken
+                claimed[group] = taken | mask
+            else:
+                claimed[group] = mask.copy()
+        masks[:, j] = mask
+    return masks
+
+def latest_risks(frame, rules=None):
+    """Return the risks present at the latest reading as a list of dicts"""
+    rules = RISK_RULES if rules is None else rules
+    if frame.empty:
+        return []
+    fired = evaluate_rules(frame.iloc[-1:], rules)[0]
+    return [
+        {'risk': rule['risk'], 'level': rule['level'], 'description': rule['description']}
+        for rule, hit in zip(rules, fired) if hit
+    ]
+
+def risk_episodes(frame, rules=None, patient_column=None):
+    """Return runs of consecutive readings that satisfy each rule
+    
+    ``frame`` is one patient's date-ordered readings, or many patients'
+    readings told apart by ``patient_column``. Returns a frame with one row
+    per episode: the patient (for cohorts), ``risk``, ``level``, ``start``
+    and ``end`` dates and the number of ``readings`` in the episode, ordered
+    by start date.
+    """
+    rules = RISK_RULES if rules is None else rules
+    columns = ([patient_column] if patient_column else []) + ['risk', 'level', 'start', 'end', 'readings']
+    if frame.empty:
+        return pd.DataFrame(columns=columns)
+    
+    if patient_column is not None:
+        codes, patients = pd.factorize(frame[patient_column])
+        order = np.lexsort((frame['date'].to_numpy(), codes))
+        frame = frame.iloc[order]
+        codes = codes[order]
+    else:
+        codes = np.zeros(len(frame), dtype=np.intp)
+    masks = evaluate_rules(frame, rules)
+    dates = frame['date'].to_numpy()
+    
+    # An episode starts where a rule turns on and ends where it turns off,
+    # with patient boundaries always breaking a run
+    same_patient = codes[1:] == codes[:-1]
+    continues = np.zeros_like(masks)
+    continues[1:] = masks[:-1] & masks[1:] & same_patient[:, None]
+    starts_at = masks & ~continues
+    ends_at = masks.copy()
+    ends_at[:-1] &= ~continues[1:]
+    
+    # Column-major order pairs each rule's starts with its ends
+    start_rules, start_rows = np.nonzero(starts_at.T)
+    _, end_rows = np.nonzero(ends_at.T)
+    episodes = {}
+    if patient_column is not None:
+        episodes[patient_column] = patients[codes[start_rows]]
+    episodes['risk'] = np.array([rule['risk'] for rule in rules], dtype=object)[start_rules]
+    episodes['level'] = np.array([rule['level'] for rule in rules], dtype=object)[start_rules]
+    episodes['start'] = dates[start_rows]
+    episodes['end'] = dates[end_rows]
+    episodes['readings'] = end_rows - start_rows + 1
+    result = pd.DataFrame(episodes, columns=columns)
+    return result.sort_values(([patient_column] if patient_column else []) + ['start'], kind='stable').reset_index(drop=True)
@@ -0,0 +1,158 @@
+from collections import deque
+import numpy as np
+import pandas as pd
+
+# Rolling windows reported for every metric, shortest first
+ROLLING_WINDOWS = {
+    '7d': pd.Timedelta(days=7),
+    '30d': pd.Timedelta(days=30),
+    '90d': pd.Timedelta(days=90),
+}
+
+# Half-life of the exponentially weighted means
+EWMA_HALFLIFE = pd.Timedelta(days=7)
+
+def dated_rows(frame):
+    """Return the rows of ``frame`` that have a date"""
+    dated = frame['date'].notna()
+    return frame if dated.all() else frame[dated]
+
+def rolling_frame(frame, metrics, windows=None, halflife=EWMA_HALFLIFE):
+    """Compute rolling and exponentially weighted means at every reading
+    
+    ``frame`` must be ordered by date. Returns a frame with its ``date``
+    column plus ``<metric>_mean_<window>`` and ``<metric>_std_<window>`` for
+    each time-based window ending at (and including) the reading, and
+    ``<metric>_ewma``. The std is the population std, as in
+    calculate_health_trends, and missing readings are skipped. Readings
+    without a date cannot be placed in a window and are left out.
+    """
+    windows = ROLLING_WINDOWS if windows is None else windows
+    frame = dated_rows(frame)
+    metrics = [metric for metric in metrics if metric in frame.columns]
+    dates = pd.DatetimeIndex(frame['date'])
+    values = pd.DataFrame({metric: frame[metric].to_numpy(dtype=float) for metric in metrics}, index=dates)
+    
+    means, stds = {}, {}
+    for name, width in windows.items():
+        rolling = values.rolling(pd.Timedelta(width))
+        means[name] = rolling.mean()
+        stds[name] = rolling.std(ddof=0)
+    ewma = values.ewm(halflife=pd.Timedelta(halflife), times=dates, adjust=False).mean()
+    
+    data = {'date': dates.to_numpy()}
+    for metric in metrics:
+        for name in windows:
+            data[f'{metric}_mean_{name}'] = means[name][metric].to_numpy()
+            data[f'{metric}_std_{name}'] = stds[name][metric].to_numpy()
+        data[f'{metric}_ewma'] = ewma[metric].to_numpy()
+    return pd.DataFrame(data)
+
+class RollingWindows:
+    """Rolling window sums and EWMA for one patient, updated as readings arrive
+    
+    Each window keeps the readings it covers in a deque with running
+    count/sum/sum of squares per metric, so a new reading costs O(1)
+    amortized no matter how long the history is. The EWMA decays by the time
+    since the metric's last reading, matching ``rolling_frame``.
+    """
+    
+    def __init__(self, metrics, windows=None, halflife=EWMA_HALFLIFE):
+        self.metrics = list(metrics)
+        self.windows = dict(ROLLING_WINDOWS if windows is None else windows)
+        self.halflife = pd.Timedelta(halflife)
+        n = len(self.metrics)
+        self._readings = {name: deque() for name in self.windows}
+        self._count = {name: np.zeros(n) for name in self.windows}
+        self._sum = {name: np.zeros(n) for name in self.windows}
+        self._sumsq = {name: np.zeros(n) for name in self.windows}
+        self._ewma = np.full(n, np.nan)
+        self._ewma_time = np.zeros(n, dtype='int64')
+        self.last_date = None
+    
+    @classmethod
+    def from_frame(cls, frame, metrics, windows=None, halflife=EWMA_HALFLIFE):
+        """Build the state from a date-ordered frame without replaying every reading"""
+        state = cls(metrics, windows, halflife)
+        frame = dated_rows(frame)
+        if frame.empty:
+            return state
+        
+        dates = frame['date'].to_numpy(dtype='datetime64[ns]').view('int64')
+        values = np.column_stack([
+            frame[metric].to_numpy(dtype=float) if metric in frame.columns else np.full(len(frame), np.nan)
+            for metric in state.metrics
+        ])
+        valid = ~np.isnan(values)
+        state.last_date = dates[-1]
+        
+        # Only readings inside each window matter for its sums
+        for name, width in state.windows.items():
+            first = np.searchsorted(dates, dates[-1] - width.value, side='right')
+            window = values[first:]
+            state._readings[name].extend(zip(dates[first:].tolist(), window))
+            state._count[name] = valid[first:].sum(axis=0).astype(float)
+            state._sum[name] = np.nansum(window, axis=0)
+            state._sumsq[name] = np.nansum(window * window, axis=0)
+        
+        # The EWMA needs the whole series once, then continues from its last value
+        times = pd.DatetimeIndex(dates.view('datetime64[ns]'))
+        ewma = pd.DataFrame(values, index=times).ewm(halflife=state.halflife, times=times, adjust=False).mean()
+        state._ewma = ewma.to_numpy()[-1]
+        for i in range(len(state.metrics)):
+            observed = np.flatnonzero(valid[:, i])
+            if len(observed):
+                state._ewma_time[i] = dates[observed[-1]]
+        return state
+    
+    def update(self, record):
+        """Add one reading; returns False if it is older than the last one seen"""
+        if record.get('date') is None:
+            return True
+        timestamp = pd.Timestamp(record['date']).value
+        if self.last_date is not None and timestamp < self.last_date:
+            return False
+        self.last_date = timestamp
+        
+        values = np.array([record.get(metric, np.nan) for metric in self.metrics], dtype=float)
+        valid = ~np.isnan(values)
+        filled = np.where(valid, values, 0.0)
+        for name, width in self.windows.items():
+            readings = self._readings[name]
+            readings.append((timestamp, values))
+            self._count[name] += valid
+            self._sum[name] += filled
+            self._sumsq[name] += filled * filled
+            
+            # Drop readings that have slid out of the window
+            cutoff = timestamp - width.value
+            while readings[0][0] <= cutoff:
+                _, old = readings.popleft()
+                old_valid = ~np.isnan(old)
+                old = np.where(old_valid, old, 0.0)
+                self._count[name] -= old_valid
+                self._sum[name] -= old
+                self._sumsq[name] -= old * old
+        
+        decay = 0.5 ** ((timestamp - self._ewma_time) / self.halflife.value)
+        first = valid & np.isnan(self._ewma)
+        self._ewma = np.where(valid, decay * self._ewma + (1 - decay) * values, self._ewma)
+        self._ewma[first] = values[first]
+        self._ewma_time[valid] = timestamp
+        return True
+    
+    def summary(self):
+        """Return {metric: {'mean_<window>', 'std_<window>', 'count_<window>', 'ewma'}} for the latest reading"""
+        result = {metric: {} for metric in self.metrics}
+        for name in self.windows:
+            count = self._count[name]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean = self._sum[name] / count
+                std = np.sqrt(np.maximum(self._sumsq[name] / count - mean * mean, 0.0))
+            for i, metric in enumerate(self.metrics):
+                result[metric][f'mean_{name}'] = float(mean[i])
+                result[metric][f'std_{name}'] = float(std[i])
+                result[metric][f'count_{name}'] = int(round(count[i]))
+        for i, metric in enumerate(self.metrics):
+            result[metric]['ewma'] = float(self._ewma[i])
+        return result
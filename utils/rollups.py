@@ -0,0 +1,169 @@
+import numpy as np
+import pandas as pd
+
+# Bucket width of each rollup tier, finest first
+ROLLUP_TIERS = {
+    'hourly': pd.Timedelta(hours=1),
+    'daily': pd.Timedelta(days=1),
+    'weekly': pd.Timedelta(weeks=1),
+}
+
+# Weekly buckets start on Monday (1970-01-05) rather than the epoch's Thursday
+_WEEK_ORIGIN = pd.Timestamp('1970-01-05').value
+
+def aggregate_frame(frame, width, metrics):
+    """Aggregate raw readings into mean/min/max/count per fixed-width bucket
+    
+    Returns a frame with a ``date`` column holding each bucket's start and
+    ``<metric>_mean``, ``_min``, ``_max`` and ``_count`` columns.
+    """
+    width = pd.Timedelta(width)
+    origin = _WEEK_ORIGIN if width == ROLLUP_TIERS['weekly'] else 0
+    dates = frame['date'].to_numpy(dtype='datetime64[ns]').view('int64')
+    buckets = (dates - origin) // width.value * width.value + origin
+    
+    grouped = frame[[m for m in metrics if m in frame.columns]].groupby(buckets, sort=True)
+    stats = grouped.agg(['mean', 'min', 'max', 'count'])
+    stats.columns = [f'{metric}_{stat}' for metric, stat in stats.columns]
+    stats.insert(0, 'date', pd.to_datetime(stats.index.to_numpy(), unit='ns'))
+    return stats.reset_index(drop=True)
+
+class RollupTier:
+    """Running count/sum/min/max per metric for fixed-width time buckets"""
+    
+    def __init__(self, width, metrics, capacity=64):
+        self.width = pd.Timedelta(width)
+        self.metrics = list(metrics)
+        self._width_ns = self.width.value
+        self._origin = _WEEK_ORIGIN if self.width == ROLLUP_TIERS['weekly'] else 0
+        self._rows = {}
+        self._size = 0
+        self._starts = np.empty(capacity, dtype='int64')
+        self._count = np.zeros((capacity, len(self.metrics)))
+        self._sum = np.zeros((capacity, len(self.metrics)))
+        self._min = np.full((capacity, len(self.metrics)), np.inf)
+        self._max = np.full((capacity, len(self.metrics)), -np.inf)
+    
+    def __len__(self):
+        return self._size
+    
+    def add(self, timestamp, values):
+        """Fold one reading (array of metric values, NaN if missing) into its bucket"""
+        ts = pd.Timestamp(timestamp).value
+        row = self._row_for((ts - self._origin) // self._width_ns * self._width_ns + self._origin)
+        valid = ~np.isnan(values)
+        self._count[row] += valid
+        self._sum[row] += np.where(valid, values, 0.0)
+        self._min[row] = np.fmin(self._min[row], values)
+        self._max[row] = np.fmax(self._max[row], values)
+    
+    def add_many(self, dates, values):
+        """Fold many readings in with one vectorized pass"""
+        if len(dates) == 0:
+            return
+        dates = np.asarray(dates, dtype='datetime64[ns]').view('int64')
+        buckets = (dates - self._origin) // self._width_ns * self._width_ns + self._origin
+        unique, inverse = np.unique(buckets, return_inverse=True)
+        rows = np.array([self._row_for(bucket) for bucket in unique])
+        
+        # Reduce each bucket's readings in one contiguous segment
+        order = np.argsort(inverse, kind='stable')
+        values = values[order]
+        segments = np.searchsorted(inverse[order], np.arange(len(unique)))
+        valid = ~np.isnan(values)
+        self._count[rows] += np.add.reduceat(valid, segments, axis=0)
+        self._sum[rows] += np.add.reduceat(np.where(valid, values, 0.0), segments, axis=0)
+        self._min[rows] = np.fmin(self._min[rows], np.fmin.reduceat(values, segments, axis=0))
+        self._max[rows] = np.fmax(self._max[rows], np.fmax.reduceat(values, segments, axis=0))
+    
+    def query(self, start=None, end=None):
+        """Return buckets starting within [start, end] as a frame ordered by date"""
+        starts = self._starts[:self._size]
+        mask = np.ones(self._size, dtype=bool)
+        if start is not None:
+            # Include the bucket that contains ``start``
+            first = pd.Timestamp(start).value
+            mask &= starts > first - self._width_ns
+        if end is not None:
+            mask &= starts <= pd.Timestamp(end).value
+        rows = np.flatnonzero(mask)
+        rows = rows[np.argsort(starts[rows], kind='stable')]
+        
+        count = self._count[rows]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = self._sum[rows] / count
+        empty = count == 0
+        data = {'date': pd.to_datetime(starts[rows], unit='ns')}
+        for i, metric in enumerate(self.metrics):
+            data[f'{metric}_mean'] = mean[:, i]
+            data[f'{metric}_min'] = np.where(empty[:, i], np.nan, self._min[rows, i])
+            data[f'{metric}_max'] = np.where(empty[:, i], np.nan, self._max[rows, i])
+            data[f'{metric}_count'] = count[:, i].astype('int64')
+        return pd.DataFrame(data)
+    
+    def _row_for(self, bucket):
+        row = self._rows.get(bucket)
+        if row is None:
+            if self._size == len(self._starts):
+                self._grow()
+            row = self._size
+            self._rows[bucket] = row
+            self._starts[row] = bucket
+            self._size += 1
+        return row
+    
+    def _grow(self):
+        capacity = len(self._starts) * 2
+        self._starts = np.resize(self._starts, capacity)
+        for name, fill in (('_count', 0.0), ('_sum', 0.0), ('_min', np.inf), ('_max', -np.inf)):
+            old = getattr(self, name)
+            grown = np.full((capacity, len(self.metrics)), fill)
+            grown[:len(old)] = old
+            setattr(self, name, grown)
+
+class PatientRollups:
+    """Hourly, daily and weekly rollup tiers for one patient"""
+    
+    def __init__(self, metrics):
+        self.metrics = list(metrics)
+        self.tiers = {name: RollupTier(width, self.metrics) for name, width in ROLLUP_TIERS.items()}
+    
+    @classmethod
+    def from_frame(cls, frame, metrics):
+        """Build all tiers from a patient's existing readings"""
+        rollups = cls(metrics)
+        rollups.add_frame(frame)
+        return rollups
+    
+    def add_record(self, record):
+        """Fold a single reading into every tier"""
+        if record.get('date') is None:
+            return
+        values = np.array([record.get(metric, np.nan) for metric in self.metrics], dtype=float)
+        for tier in self.tiers.values():
+            tier.add(record['date'], values)
+    
+    def add_frame(self, frame):
+        """Fold a frame of readings into every tier"""
+        if frame.empty or 'date' not in frame.columns:
+            return
+        frame = frame[frame['date'].notna()]
+        values = np.column_stack([
+            frame[metric].to_numpy(dtype=float) if metric in frame.columns else np.full(len(frame), np.nan)
+            for metric in self.metrics
+        ])
+        for tier in self.tiers.values():
+            tier.add_many(frame['date'], values)
+    
+    def tier_for(self, resolution):
+        """Return the name of the coarsest tier no coarser than ``resolution``, or None"""
+        resolution = pd.Timedelta(resolution)
+        fitting = [name for name, width in ROLLUP_TIERS.items() if width <= resolution]
+        return fitting[-1] if fitting else None
+    
+    def query(self, start=None, end=None, resolution='1D'):
+        """Return pre-aggregated points from the coarsest tier that fits ``resolution``"""
+        tier = self.tier_for(resolution)
+        if tier is None:
+            return None
+        return self.tiers[tier].query(start, end)
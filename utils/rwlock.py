@@ -0,0 +1,46 @@
+import threading
+from contextlib import contextmanager
+
+class ReadWriteLock:
+    """Readers-writer lock allowing many concurrent readers or one writer
+    
+    Waiting writers block new readers, so a steady stream of reads cannot
+    starve writes. The lock is not reentrant.
+    """
+    
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+    
+    @contextmanager
+    def reading(self):
+        """Hold the lock for reading"""
+        with self._cond:
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._cond.notify_all()
+    
+    @contextmanager
+    def writing(self):
+        """Hold the lock exclusively for writing"""
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
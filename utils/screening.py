@@ -0,0 +1,177 @@
+"""Population risk screening across every stored patient
+
+Run as a nightly job from the repository root, e.g.:
+
+    python -m utils.screening --db health.db --output risk_screening.csv --workers 8
+
+Patient names are split into shards that a process pool screens in
+parallel. Each worker opens the store itself and loads its shard's data, so
+only names and small result rows cross process boundaries. Rows are written
+as shards finish, and the output is then ranked by risk score.
+"""
+import os
+import csv
+import time
+import argparse
+import pandas as pd
+from utils.batch import run_sharded, shard_names
+from utils.patient_store import open_store
+
+# Contribution of each risk level to a patient's risk score
+RISK_LEVEL_SCORES = {'High': 3, 'Moderate': 2, 'Low': 1}
+
+SCREENING_COLUMNS = [
+    'patient_name', 'patient_id', 'risk_score', 'highest_level', 'risks',
+    'high_priority_recommendations', 'recommendations', 'readings', 'last_reading'
+]
+
+def screen_patient(analytics, profile, health_data):
+    """Return one screening row for a patient's profile and health data"""
+    risks = analytics.assess_health_risks(health_data, profile)
+    recommendations = analytics.generate_health_recommendations(health_data, profile)
+    levels = [risk['level'] for risk in risks]
+    return {
+        'patient_name': profile['name'],
+        'patient_id': profile.get('patient_id', ''),
+        'risk_score': sum(RISK_LEVEL_SCORES.get(level, 0) for level in levels),
+        'highest_level': max(levels, key=lambda level: RISK_LEVEL_SCORES.get(level, 0)) if levels else '',
+        'risks': '; '.join(risk['risk'] for risk in risks),
+        'high_priority_recommendations': sum(rec['priority'] == 'High' for rec in recommendations),
+        'recommendations': '; '.join(rec['category'] for rec in recommendations),
+        'readings': len(health_data),
+        'last_reading': health_data['date'].iloc[-1] if 'date' in health_data.columns and len(health_data) else ''
+    }
+
+def _screen_shard(store, analytics, names):
+    rows = []
+    for name in names:
+        profile = store.load_patient(name)
+        health_data = store.load_health_data(name)
+        if profile is None or health_data.empty:
+            continue
+        rows.append(screen_patient(analytics, profile, health_data))
+    return rows
+
+class _CSVWriter:
+    def __init__(self, path):
+        self._file = open(path, 'w', newline='', encoding='utf-8')
+        self._writer = csv.DictWriter(self._file, fieldnames=SCREENING_COLUMNS)
+        self._writer.writeheader()
+    
+    def write(self, rows):
+        self._writer.writerows(rows)
+        self._file.flush()
+    
+    def close(self):
+        self._file.close()
+
+class _ParquetWriter:
+    def __init__(self, path):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as e:
+            raise RuntimeError("Parquet output requires pyarrow (pip install pyarrow)") from e
+        self._pa = pyarrow
+        self._path = path
+        self._writer = None
+    
+    def write(self, rows):
+        # Each finished shard becomes one row group
+        table = self._pa.Table.from_pandas(pd.DataFrame(rows, columns=SCREENING_COLUMNS), preserve_index=False)
+        if self._writer is None:
+            self._writer = self._pa.parquet.ParquetWriter(self._path, table.schema)
+        self._writer.write_table(table)
+    
+    def close(self):
+        if self._writer is None:
+            self.write([])
+        self._writer.close()
+
+def rank_output(path, format='csv'):
+    """Sort a screening output by risk score, highest first, in place"""
+    if format == 'parquet':
+        results = pd.read_parquet(path)
+    else:
+        results = pd.read_csv(path, keep_default_na=False)
+    results = results.sort_values(
+        ['risk_score', 'high_priority_recommendations', 'patient_name'],
+        ascending=[False, False, True],
+        kind='stable'
+    )
+    results.insert(0, 'rank', range(1, len(results) + 1))
+    
+    # Write next to the output and rename, so a reader never sees a partial file
+    tmp_path = path + '.tmp'
+    if format == 'parquet':
+        results.to_parquet(tmp_path, index=False)
+    else:
+        results.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    return results
+
+def run_screening(output, db_path=None, column_store_dir=None, format='csv', workers=None, shard_size=250,
+                  progress=None):
+    """Screen every stored patient and write a ranked list to ``output``
+    
+    ``db_path``/``column_store_dir`` select the store as in open_store.
+    ``workers`` defaults to the number of CPUs. ``progress`` is called with
+    (patients screened, total patients) as shards finish. Returns a summary
+    dict with counts, elapsed time and patients per second.
+    """
+    store = open_store(db_path=db_path, column_store_dir=column_store_dir)
+    if store is None:
+        raise ValueError("Screening needs a patient store: pass a database path or column store directory")
+    names = store.list_patient_names()
+    store.close()
+    
+    writer = _ParquetWriter(output) if format == 'parquet' else _CSVWriter(output)
+    screened = 0
+    start = time.perf_counter()
+    try:
+        for rows in run_sharded(_screen_shard, names, db_path, column_store_dir, workers, shard_size):
+            writer.write(rows)
+            screened += len(rows)
+            if progress is not None:
+                progress(screened, len(names))
+    finally:
+        writer.close()
+    
+    if screened:
+        rank_output(output, format=format)
+    elapsed = time.perf_counter() - start
+    return {
+        'patients': len(names),
+        'screened': screened,
+        'skipped': len(names) - screened,
+        'shards': len(shard_names(names, shard_size)),
+        'seconds': elapsed,
+        'patients_per_sec': screened / elapsed if elapsed > 0 else 0.0
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rank every stored patient by current health risk")
+    parser.add_argument('--db', dest='db_path', help="SQLite patient store (default: $HEALTHAI_DB_PATH)")
+    parser.add_argument('--column-store', dest='column_store_dir',
+                        help="Column store directory (default: $HEALTHAI_COLUMN_STORE_DIR)")
+    parser.add_argument('--output', default='risk_screening.csv', help="Output file")
+    parser.add_argument('--format', choices=['csv', 'parquet'], help="Output format (default: from the file extension)")
+    parser.add_argument('--workers', type=int, help="Worker processes (default: number of CPUs)")
+    parser.add_argument('--shard-size', type=int, default=250, help="Patients per work item")
+    args = parser.parse_args(argv)
+    
+    format = args.format or ('parquet' if args.output.endswith('.parquet') else 'csv')
+    summary = run_screening(
+        args.output,
+        db_path=args.db_path,
+        column_store_dir=args.column_store_dir,
+        format=format,
+        workers=args.workers,
+        shard_size=args.shard_size,
+        progress=lambda screened, total: print(f"\rScreened {screened}/{total} patients", end='', flush=True)
+    )
+    print(f"\nWrote {summary['screened']} patients to {args.output} in {summary['seconds']:.1f} s "
+          f"({summary['patients_per_sec']:.0f} patients/sec, {summary['skipped']} without data)")
+
+if __name__ == '__main__':
+    main()
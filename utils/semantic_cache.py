@@ -0,0 +1,191 @@
+import re
+import zlib
+import threading
+import numpy as np
+
+# Common words that carry no meaning about the question itself
+STOP_WORDS = frozenset("""
+a about am an and any are as at be been but by can could do does doing for from had has have having how i i'm
+if in into is it its just me my of on or so some than that the their them then there these they this to too
+very was we were what when where which while who why will with would you your really feel feeling i've got
+""".split())
+
+# Everyday phrasings mapped onto shared terms, so paraphrases of the same
+# complaint get overlapping vectors; extend as chat logs show new phrasings
+SYNONYMS = {
+    'headache': 'head pain', 'headaches': 'head pain', 'migraine': 'head pain', 'migraines': 'head pain',
+    'stomachache': 'stomach pain', 'tummy': 'stomach', 'belly': 'stomach', 'abdominal': 'stomach',
+    'hurts': 'pain', 'hurt': 'pain', 'hurting': 'pain', 'ache': 'pain', 'aches': 'pain', 'aching': 'pain',
+    'sore': 'pain', 'painful': 'pain', 'pains': 'pain',
+    'temperature': 'fever', 'feverish': 'fever', 'tired': 'fatigue', 'exhausted': 'fatigue',
+    'dizzy': 'dizziness', 'lightheaded': 'dizziness', 'vomiting': 'nausea', 'nauseous': 'nausea',
+    'throwing': 'nausea', 'bad': 'severe', 'terrible': 'severe', 'awful': 'severe', 'intense': 'severe',
+    'lot': 'severe', 'lots': 'severe', 'eating': 'eat', 'ate': 'eat', 'meal': 'eat', 'meals': 'eat'
+}
+
+# Words that flip a question's meaning, with contractions folded into "not"
+NEGATIONS = frozenset(['no', 'not', 'never', 'without', 'none', 'nor', 'cannot'])
+
+# Who the question is about; advice for a pregnant patient or a child differs
+# from the same symptom in an adult, so these must match too
+QUALIFIERS = {
+    'pregnant': 'pregnant', 'pregnancy': 'pregnant', 'breastfeeding': 'breastfeeding', 'nursing': 'breastfeeding',
+    'baby': 'child', 'infant': 'child', 'toddler': 'child', 'child': 'child', 'children': 'child', 'kid': 'child',
+    'kids': 'child', 'son': 'child', 'daughter': 'child', 'elderly': 'elderly', 'diabetic': 'diabetic',
+    'diabetes': 'diabetic'
+}
+
+_TOKEN = re.compile(r"[a-z0-9']+")
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+
+def normalize_query(text):
+    """Lowercase, drop stop words and map synonyms onto shared terms"""
+    words = []
+    for word in _TOKEN.findall(text.lower()):
+        if word not in STOP_WORDS:
+            words.extend(SYNONYMS.get(word, word).split())
+    return words
+
+def meaning_guard(text):
+    """Return the numbers, negations and qualifiers of ``text``, which must match exactly for a cache hit
+    
+    Doses, durations, negations and who the question is about change what
+    it means while barely moving its similarity: "should I take 200mg
+    ibuprofen" and "should I take 800mg ibuprofen" differ in a single token.
+    """
+    lowered = text.lower()
+    negations = []
+    qualifiers = set()
+    for word in _TOKEN.findall(lowered):
+        if word.endswith("n't") or word == 'cannot':
+            negations.append('not')
+        elif word in NEGATIONS:
+            negations.append(word)
+        elif word in QUALIFIERS:
+            qualifiers.add(QUALIFIERS[word])
+    return tuple(sorted(_NUMBER.findall(lowered))), tuple(sorted(negations)), tuple(sorted(qualifiers))
+
+class HashedVectorizer:
+    """Hashed bag of words and character n-grams
+    
+    Words and the 3- to 5-character n-grams inside each word are hashed
+    into ``n_features`` buckets with CRC32, which is stable across
+    processes. Words carry the meaning; character n-grams tolerate
+    typos and different word forms ("hurting" and "hurts").
+    """
+    
+    def __init__(self, n_features=1024, ngram_range=(3, 5)):
+        self.n_features = n_features
+        self.ngram_range = ngram_range
+    
+    def features(self, text):
+        """Return the hashed feature indices of ``text``, with repeats"""
+        indices = []
+        low, high = self.ngram_range
+        for word in normalize_query(text):
+            indices.append(zlib.crc32(word.encode('utf-8')) % self.n_features)
+            padded = f' {word} '
+            for n in range(low, high + 1):
+                for i in range(len(padded) - n + 1):
+                    indices.append(zlib.crc32(padded[i:i + n].encode('utf-8')) % self.n_features)
+        return indices
+    
+    def transform(self, text):
+        """Return the sublinear term frequency vector of ``text``"""
+        vector = np.zeros(self.n_features, dtype=np.float32)
+        indices, counts = np.unique(self.features(text), return_counts=True)
+        vector[indices] = 1 + np.log(counts)
+        return vector
+
+class SemanticCache:
+    """Answers to earlier questions, looked up by TF-IDF cosine similarity
+    
+    Each answered question is stored as a hashed TF vector. IDF weights come
+    from the stored questions and are refreshed, together with the weighted
+    and normalized matrix, once enough questions have been added since the
+    last refresh. The matrix is stored feature-major, so a lookup only reads
+    the rows of the few features in the question. A lookup returns
+    the best answer with the same ``scope`` (e.g. the patient context) and
+    the same meaning_guard (numbers, negations and qualifiers) whose similarity reaches
+    ``threshold``. Once ``max_entries`` is reached the oldest entries are
+    overwritten.
+    
+    Similarity is lexical: questions that share most of their words match
+    even when one detail differs, so keep the threshold high. A different
+    question sharing most of its words with a cached one scored 0.72 to 0.76
+    depending on the other cached questions, so the default of 0.8 errs
+    towards calling the model; benchmarks/semantic_cache.py checks such pairs.
+    """
+    
+    def __init__(self, threshold=0.8, max_entries=2000, n_features=1024, refresh_every=0.1):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.refresh_every = refresh_every
+        self.vectorizer = HashedVectorizer(n_features)
+        self.hits = 0
+        self.misses = 0
+        self._tf = np.zeros((max_entries, n_features), dtype=np.float32)
+        self._weighted = np.zeros((n_features, max_entries), dtype=np.float32)
+        self._scopes = np.zeros(max_entries, dtype=np.int64)
+        self._entries = [None] * max_entries
+        self._scope_ids = {}
+        self._idf = np.ones(n_features, dtype=np.float32)
+        self._size = 0
+        self._next = 0
+        self._stale = 0
+        self._lock = threading.Lock()
+    
+    def lookup(self, query, scope=''):
+        """Return the cached response for the closest earlier question, or None"""
+        vector = self.vectorizer.transform(query)
+        with self._lock:
+            scope_id = self._scope_ids.get((scope, meaning_guard(query)))
+            if scope_id is None or not self._size or not vector.any():
+                self.misses += 1
+                return None
+            features = np.flatnonzero(vector)
+            weighted = vector[features] * self._idf[features]
+            scores = (weighted / np.linalg.norm(weighted)) @ self._weighted[features, :self._size]
+            scores[self._scopes[:self._size] != scope_id] = -1.0
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return self._entries[best][1]
+    
+    def add(self, query, response, scope=''):
+        """Remember the response to ``query``"""
+        vector = self.vectorizer.transform(query)
+        if not vector.any():
+            return
+        with self._lock:
+            row = self._next
+            self._next = (row + 1) % self.max_entries
+            self._size = max(self._size, row + 1)
+            self._tf[row] = vector
+            # Entries only match lookups with the same scope and guard
+            key = (scope, meaning_guard(query))
+            self._scopes[row] = self._scope_ids.setdefault(key, len(self._scope_ids))
+            self._entries[row] = (query, response)
+            self._stale += 1
+            if self._stale > self.refresh_every * self._size:
+                self._refresh()
+            else:
+                # Weight the new row with the current IDF until the next refresh
+                weighted = vector * self._idf
+                self._weighted[:, row] = weighted / np.linalg.norm(weighted)
+    
+    def stats(self):
+        """Return hit/miss counters and current size"""
+        return {'hits': self.hits, 'misses': self.misses, 'size': self._size, 'maxsize': self.max_entries,
+                'threshold': self.threshold}
+    
+    def _refresh(self):
+        tf = self._tf[:self._size]
+        df = np.count_nonzero(tf, axis=0)
+        self._idf = (np.log((1 + self._size) / (1 + df)) + 1).astype(np.float32)
+        weighted = tf * self._idf
+        norms = np.linalg.norm(weighted, axis=1, keepdims=True)
+        self._weighted[:, :self._size] = (weighted / np.where(norms > 0, norms, 1.0)).T
+        self._stale = 0
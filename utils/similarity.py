@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+
+# Trend statistics that make up a patient's feature vector, per metric
+FEATURE_STATS = ['average', 'std', 'slope', 'current']
+
+def correlation_matrix(frame, metrics):
+    """Return the Pearson correlation matrix between metrics of one patient's readings"""
+    metrics = [metric for metric in metrics if metric in frame.columns]
+    return frame[metrics].astype(float).corr()
+
+def cohort_correlations(cohort_data, metrics, patient_column='patient_name'):
+    """Return per-patient correlation matrices for a long frame of many patients
+    
+    Pairwise sums for every patient come from one ``bincount`` per metric
+    pair, so no per-patient Python loop is needed. Only readings where both
+    metrics are present count towards a pair. Returns ``(patients, matrices)``
+    where ``matrices`` has shape (patients, metrics, metrics).
+    """
+    metrics = [metric for metric in metrics if metric in cohort_data.columns]
+    codes, patients = pd.factorize(cohort_data[patient_column])
+    n = len(patients)
+    values = cohort_data[metrics].to_numpy(dtype=float)
+    valid = ~np.isnan(values)
+    filled = np.where(valid, values, 0.0)
+    
+    matrices = np.full((n, len(metrics), len(metrics)), np.nan)
+    for i in range(len(metrics)):
+        matrices[:, i, i] = 1.0
+        for j in range(i + 1, len(metrics)):
+            both = valid[:, i] & valid[:, j]
+            x, y = filled[:, i] * both, filled[:, j] * both
+            count = np.bincount(codes, weights=both, minlength=n)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean_x = np.bincount(codes, weights=x, minlength=n) / count
+                mean_y = np.bincount(codes, weights=y, minlength=n) / count
+                dx = np.where(both, x - mean_x[codes], 0.0)
+                dy = np.where(both, y - mean_y[codes], 0.0)
+                c_xy = np.bincount(codes, weights=dx * dy, minlength=n)
+                var_x = np.bincount(codes, weights=dx * dx, minlength=n)
+                var_y = np.bincount(codes, weights=dy * dy, minlength=n)
+                corr = c_xy / np.sqrt(var_x * var_y)
+            matrices[:, i, j] = matrices[:, j, i] = corr
+    return patients, matrices
+
+def trend_features(cohort_trends, metrics):
+    """Turn a tidy cohort trends frame into one feature row per patient
+    
+    ``cohort_trends`` is the output of HealthAnalytics.calculate_cohort_trends.
+    Returns ``(patients, features, columns)`` with ``features`` of shape
+    (patients, len(metrics) * len(FEATURE_STATS)); missing stats are NaN.
+    """
+    wide = cohort_trends.pivot_table(index=cohort_trends.index, columns='metric', values=FEATURE_STATS,
+                                     observed=False)
+    columns = [(stat, metric) for metric in metrics for stat in FEATURE_STATS]
+    wide = wide.reindex(columns=pd.MultiIndex.from_tuples(columns))
+    return wide.index.tolist(), wide.to_numpy(dtype=float), [f'{metric}_{stat}' for stat, metric in columns]
+
+class SimilarityIndex:
+    """Nearest-neighbour index over patient feature vectors
+    
+    Features are standardized per column with the cohort's mean and std,
+    then scaled to unit length and kept as one float32 matrix, so a query is
+    a single matrix-vector product plus a partial sort. That answers top-k
+    queries in a few milliseconds over 100k patients. Similarity is the
+    cosine of the standardized vectors, from -1 to 1.
+    """
+    
+    def __init__(self, names, features, capacity=None):
+        features = np.asarray(features, dtype=float)
+        self.mean = np.nanmean(features, axis=0) if len(features) else np.zeros(features.shape[1])
+        std = np.nanstd(features, axis=0) if len(features) else np.ones(features.shape[1])
+        self.std = np.where(std > 0, std, 1.0)
+        self.mean = np.nan_to_num(self.mean)
+        
+        capacity = max(capacity or 0, len(names), 16)
+        self._vectors = np.zeros((capacity, features.shape[1]), dtype=np.float32)
+        self._names = []
+        self._rows = {}
+        for name, row in zip(names, self._normalize(features)):
+            self._set(name, row)
+    
+    @classmethod
+    def from_trends(cls, cohort_trends, metrics):
+        """Build an index from HealthAnalytics.calculate_cohort_trends output"""
+        names, features, _ = trend_features(cohort_trends, metrics)
+        return cls(names, features)
+    
+    def __len__(self):
+        return len(self._names)
+    
+    def __contains__(self, name):
+        return name in self._rows
+    
+    def update(self, name, features):
+        """Add or replace one patient's feature vector"""
+        self._set(name, self._normalize(np.asarray(features, dtype=float).reshape(1, -1))[0])
+    
+    def query(self, target, k=20):
+        """Return the ``k`` most similar patients as a list of (name, similarity)
+        
+        ``target`` is an indexed patient name, who is left out of the
+        results, or a raw feature vector.
+        """
+        if isinstance(target, str):
+            exclude = self._rows[target]
+            vector = self._vectors[exclude]
+        else:
+            exclude = None
+            vector = self._normalize(np.asarray(target, dtype=float).reshape(1, -1))[0]
+        
+        size = len(self._names)
+        scores = self._vectors[:size] @ vector
+        if exclude is not None:
+            scores[exclude] = -np.inf
+        k = min(k, size - (exclude is not None))
+        if k <= 0:
+            return []
+        top = np.argpartition(scores, -k)[-k:]
+        top = top[np.argsort(scores[top])[::-1]]
+        return [(self._names[row], float(scores[row])) for row in top]
+    
+    def _normalize(self, features):
+        # Standardize, treat missing stats as average, then scale to unit length
+        z = np.nan_to_num((features - self.mean) / self.std)
+        norms = np.linalg.norm(z, axis=1, keepdims=True)
+        return (z / np.where(norms > 0, norms, 1.0)).astype(np.float32)
+    
+    def _set(self, name, vector):
+        row = self._rows.get(name)
+        if row is None:
+            row = len(self._names)
+            if row == len(self._vectors):
+                grown = np.zeros((len(self._vectors) * 2, self._vectors.shape[1]), dtype=np.float32)
+                grown[:row] = self._vectors
+                self._vectors = grown
+            self._names.append(name)
+            self._rows[name] = row
+        self._vectors[row] = vector
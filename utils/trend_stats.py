@@ -0,0 +1,152 @@
+import math
+import numpy as np
+import pandas as pd
+
+class RunningTrend:
+    """Streaming statistics for one metric, updated in O(1) per reading
+    
+    Keeps Welford-style running means and co-moments of (position, value), which
+    give the least-squares slope over the reading index (as ``np.polyfit`` on
+    ``arange(n)`` would) plus mean, population std, min, max and the latest
+    value without revisiting earlier readings.
+    """
+    
+    def __init__(self):
+        self.count = 0
+        self.mean_x = 0.0
+        self.mean_y = 0.0
+        self.m2_x = 0.0
+        self.m2_y = 0.0
+        self.c_xy = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.current = math.nan
+    
+    def update(self, position, value):
+        """Add one reading taken at row ``position``"""
+        self.count += 1
+        dx = position - self.mean_x
+        dy = value - self.mean_y
+        self.mean_x += dx / self.count
+        self.mean_y += dy / self.count
+        self.m2_x += dx * (position - self.mean_x)
+        self.m2_y += dy * (value - self.mean_y)
+        self.c_xy += dx * (value - self.mean_y)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.current = value
+    
+    def update_many(self, positions, values):
+        """Merge a batch of readings using the pairwise (Chan et al.) combination"""
+        count = len(values)
+        if count == 0:
+            return
+        mean_x = positions.mean()
+        mean_y = values.mean()
+        batch = RunningTrend()
+        batch.count = count
+        batch.mean_x = mean_x
+        batch.mean_y = mean_y
+        batch.m2_x = float(((positions - mean_x) ** 2).sum())
+        batch.m2_y = float(((values - mean_y) ** 2).sum())
+        batch.c_xy = float(((positions - mean_x) * (values - mean_y)).sum())
+        batch.min = float(values.min())
+        batch.max = float(values.max())
+        batch.current = float(values[-1])
+        self.merge(batch)
+    
+    def merge(self, other):
+        """Fold another RunningTrend covering later readings into this one"""
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.__dict__.update(other.__dict__)
+            return
+        total = self.count + other.count
+        dx = other.mean_x - self.mean_x
+        dy = other.mean_y - self.mean_y
+        weight = self.count * other.count / total
+        self.m2_x += other.m2_x + dx * dx * weight
+        self.m2_y += other.m2_y + dy * dy * weight
+        self.c_xy += other.c_xy + dx * dy * weight
+        self.mean_x += dx * other.count / total
+        self.mean_y += dy * other.count / total
+        self.count = total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.current = other.current
+    
+    @property
+    def slope(self):
+        return self.c_xy / self.m2_x if self.m2_x > 0 else 0.0
+    
+    def as_trend(self):
+        """Return the statistics in the shape used by calculate_health_trends"""
+        return {
+            'slope': self.slope,
+            'current': self.current,
+            'average': self.mean_y,
+            'min': self.min,
+            'max': self.max,
+            'std': math.sqrt(self.m2_y / self.count) if self.count else 0.0
+        }
+
+class TrendStats:
+    """Running trend statistics for every metric of one patient
+    
+    Readings must arrive in date order; ``update`` reports an out-of-order
+    reading so the owner can rebuild from the sorted history instead.
+    """
+    
+    def __init__(self, metrics):
+        self.metrics = list(metrics)
+        self.trends = {metric: RunningTrend() for metric in self.metrics}
+        self.rows = 0
+        self.last_date = None
+    
+    @classmethod
+    def from_frame(cls, frame, metrics):
+        """Build statistics from a date-ordered frame in one vectorized pass"""
+        stats = cls(metrics)
+        stats.update_frame(frame)
+        return stats
+    
+    def update(self, record):
+        """Add one record; returns False if it is older than the last one seen"""
+        date = record.get('date')
+        if date is not None:
+            date = pd.Timestamp(date)
+            if self.last_date is not None and date < self.last_date:
+                return False
+            self.last_date = date
+        
+        for metric in self.metrics:
+            value = record.get(metric)
+            if value is not None and not math.isnan(value):
+                self.trends[metric].update(self.rows, float(value))
+        self.rows += 1
+        return True
+    
+    def update_frame(self, frame):
+        """Add a date-ordered frame of records; returns False if it starts too early"""
+        if frame.empty:
+            return True
+        if 'date' in frame.columns:
+            dates = frame['date']
+            if self.last_date is not None and dates.iloc[0] < self.last_date:
+                return False
+            self.last_date = pd.Timestamp(dates.iloc[-1])
+        
+        positions = np.arange(self.rows, self.rows + len(frame), dtype=float)
+        for metric in self.metrics:
+            if metric not in frame.columns:
+                continue
+            values = frame[metric].to_numpy(dtype=float)
+            valid = ~np.isnan(values)
+            self.trends[metric].update_many(positions[valid], values[valid])
+        self.rows += len(frame)
+        return True
+    
+    def as_trends(self):
+        """Return {metric: trend dict} for metrics with more than one reading"""
+        return {metric: trend.as_trend() for metric, trend in self.trends.items() if trend.count > 1}